@@ -20,6 +20,7 @@ import { Separator } from "@/components/ui/separator"
 import { MessageSquare, Plus } from "lucide-react"
 import { ChatMessages, Message } from "@/components/chat/chat-messages"
 import { ChatInput } from "@/components/chat/chat-input"
+import { uploadFile } from "@/lib/api"
 
 export default function ChatPage() {
 
@@ -71,14 +72,8 @@ export default function ChatPage() {
       const blob = new Blob([cachedCsv], { type: 'text/csv' });
       const file = new File([blob], cachedFilename, { type: 'text/csv' });
 
-      const formData = new FormData();
-      formData.append("file", file);
-
       // Re-upload silently in background to restore server state
-      fetch(`${process.env.NEXT_PUBLIC_API_URL}/upload`, {
-        method: "POST",
-        body: formData
-      }).then(() => {
+      uploadFile(file).then(() => {
         console.log("Session restored from localStorage")
       }).catch(err => {
         console.error("Failed to restore session", err)
@@ -104,7 +99,9 @@ export default function ChatPage() {
         },
         body: JSON.stringify({
           question: content,
-          visualize: visualize
+          visualize: visualize,
+          user_id: localStorage.getItem("user_id"),
+          dataset_id: localStorage.getItem("dataset_id")
         }),
       });
 
@@ -5,12 +5,15 @@ import { Navbar } from "@/components/navbar"
 import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle, CardFooter } from "@/components/ui/card"
 import { Sparkles, Download, FileCheck, AlertCircle, ArrowRight } from "lucide-react"
+import { datasetParams, waitForJob } from "@/lib/api"
 
 export default function DataCleaningPage() {
     const [isLoading, setIsLoading] = useState(false)
     const [status, setStatus] = useState<"idle" | "success" | "error">("idle")
     const [errorMessage, setErrorMessage] = useState("")
     const [summary, setSummary] = useState("")
+    const [jobId, setJobId] = useState("")
+    const [stage, setStage] = useState("")
 
     const [problemType, setProblemType] = useState<"general" | "sentiment_analysis" | "classification" | "binary_classification">("general")
     const [targetCol, setTargetCol] = useState("")
@@ -23,7 +26,7 @@ export default function DataCleaningPage() {
 
         try {
             // Build query params
-            const params = new URLSearchParams()
+            const params = datasetParams()
             params.append("problem_type", problemType)
             if ((problemType === "classification" || problemType === "binary_classification") && targetCol) {
                 params.append("target", targetCol)
@@ -39,8 +42,12 @@ export default function DataCleaningPage() {
                 throw new Error(data.detail || "Failed to clean data")
             }
 
+            // Cleaning runs as a background job; poll it until the result is ready
+            const job = await waitForJob(data.job_id, 500, (job) => setStage(job.stage || ""))
+
+            setJobId(data.job_id)
             setStatus("success")
-            setSummary(data.summary) // Use the AI-generated summary
+            setSummary(job.result.summary) // Use the AI-generated summary
 
         } catch (error: any) {
             console.error("Cleaning error:", error)
@@ -48,13 +55,18 @@ export default function DataCleaningPage() {
             setErrorMessage(error.message)
         } finally {
             setIsLoading(false)
+            setStage("")
         }
     }
 
     const handleDownload = () => {
-        // Trigger download of the last cleaned file
+        // Trigger download of this job's cleaned file
+        const params = new URLSearchParams({ job_id: jobId })
+        const userId = localStorage.getItem("user_id")
+        if (userId) params.append("user_id", userId)
+
         const link = document.createElement('a');
-        link.href = `${process.env.NEXT_PUBLIC_API_URL}/download/advanced`;
+        link.href = `${process.env.NEXT_PUBLIC_API_URL}/download/advanced?${params.toString()}`;
         link.download = 'cleaned_data.csv';
         document.body.appendChild(link);
         link.click();
@@ -194,7 +206,7 @@ export default function DataCleaningPage() {
                                 className="min-w-[150px]"
                             >
                                 {isLoading ? (
-                                    <>Processing...</>
+                                    <>{stage ? `Processing (${stage.replace("_", " ")})...` : "Processing..."}</>
                                 ) : (
                                     <>
                                         Start Cleaning
@@ -14,6 +14,7 @@ import { Separator } from "@/components/ui/separator"
 
 import { Upload, Database, FileText, BarChart3, TrendingUp, Zap } from "lucide-react"
 import { Navbar } from "@/components/navbar"
+import { uploadFile } from "@/lib/api"
 import Image from "next/image"
 
 export default function LandingPage() {
@@ -37,9 +38,6 @@ export default function LandingPage() {
 
   const handleGetStarted = async () => {
     if (selectedFile) {
-      const formData = new FormData();
-      formData.append("file", selectedFile);
-
       // Save to localStorage for persistence
       try {
         if (selectedFile.size < 5 * 1024 * 1024) { // Limit to 5MB for localStorage
@@ -58,10 +56,7 @@ export default function LandingPage() {
       }
 
       try {
-        await fetch(`${process.env.NEXT_PUBLIC_API_URL}/upload`, {
-          method: "POST",
-          body: formData
-        });
+        await uploadFile(selectedFile);
 
         router.push("/chat")
 
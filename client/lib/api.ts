@@ -0,0 +1,57 @@
+const API_URL = process.env.NEXT_PUBLIC_API_URL
+
+export async function waitForJob(jobId: string, intervalMs = 500, onProgress?: (job: any) => void) {
+  const params = new URLSearchParams()
+  const userId = localStorage.getItem("user_id")
+  if (userId) params.append("user_id", userId)
+
+  while (true) {
+    const res = await fetch(`${API_URL}/jobs/${jobId}?${params.toString()}`)
+    const job = await res.json()
+
+    if (!res.ok) {
+      throw new Error(job.detail || `Server error: ${res.status}`)
+    }
+    onProgress?.(job)
+    if (job.status === "done") {
+      return job
+    }
+    if (job.status === "failed") {
+      throw new Error(job.error || "Job failed")
+    }
+
+    await new Promise((resolve) => setTimeout(resolve, intervalMs))
+  }
+}
+
+export function datasetParams() {
+  const params = new URLSearchParams()
+  const datasetId = localStorage.getItem("dataset_id")
+  const userId = localStorage.getItem("user_id")
+
+  if (datasetId) params.append("dataset_id", datasetId)
+  if (userId) params.append("user_id", userId)
+  return params
+}
+
+export async function uploadFile(file: File) {
+  const formData = new FormData()
+  formData.append("file", file)
+
+  const userId = localStorage.getItem("user_id")
+  if (userId) formData.append("user_id", userId)
+
+  const res = await fetch(`${API_URL}/upload`, {
+    method: "POST",
+    body: formData
+  })
+  const data = await res.json()
+
+  if (!res.ok) {
+    throw new Error(data.detail || "Upload failed")
+  }
+
+  const job = await waitForJob(data.job_id)
+  localStorage.setItem("dataset_id", data.dataset_id)
+  return job
+}
@@ -0,0 +1,186 @@
+"""Synthetic inventory/sales datasets shaped like C.csv.
+
+    python -m benchmarks.generate --rows 1000000 --out /tmp/sales.arrow
+    python -m benchmarks.generate --rows 100000 --nulls 0.05 --duplicates 0.02 --text-words 20 --out /tmp/sales.csv
+
+Rows are produced in chunks, so files of 10^8 rows can be written without
+holding them in memory. Output format follows the extension (.csv, .parquet
+or .arrow); the same seed always gives the same data.
+"""
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Column names exactly as in C.csv, line breaks included
+PRODUCT_ID = "Product ID"
+PRODUCT_NAME = "Product Name"
+OPENING = "Opening \nStock"
+PURCHASED = "Purchase/\nStock in"
+SOLD = "Number of \nUnits Sold"
+IN_STOCK = "Hand-In-\nStock"
+UNIT_COST = "Cost Price \nPer Unit (USD)"
+TOTAL_COST = "Cost Price\nTotal (USD)"
+
+PRODUCT_NAMES = [
+    "Laptop", "Monitor", "Keyboard", "Mouse", "Printer", "Scanner", "Webcam",
+    "Headphones", "Speakers", "Microphone", "Router", "Switch", "Tablet",
+    "Smartphone", "Charger", "USB Cable", "HDMI Cable", "External HDD", "SSD",
+    "Memory Card", "Projector", "Desk Lamp", "Office Chair", "Desk",
+    "Whiteboard", "Marker Set", "Notebook", "Stapler", "Paper Ream", "Ink Cartridge",
+]
+
+# Typical unit cost (USD) per product name
+BASE_COSTS = np.array([
+    1200, 500, 50, 25, 300, 250, 80, 150, 120, 90, 110, 200, 600, 800, 30,
+    10, 15, 100, 140, 20, 700, 35, 250, 400, 60, 12, 5, 8, 6, 40
+])
+
+WORDS = np.array([
+    "good", "bad", "great", "poor", "excellent", "terrible", "fast", "slow",
+    "cheap", "expensive", "reliable", "broken", "love", "hate", "works",
+    "returned", "quality", "delivery", "price", "support", "would", "buy",
+    "again", "never", "recommend", "okay", "amazing", "awful", "fine", "late",
+])
+
+CLASS_LABELS = ["yes", "no", "maybe", "unknown", "other"]
+
+def class_probabilities(imbalance, classes):
+    """The first class takes `imbalance` of the rows, the rest share the remainder."""
+    if classes == 1:
+        return np.array([1.0])
+    rest = (1 - imbalance) / (classes - 1)
+    return np.array([imbalance] + [rest] * (classes - 1))
+
+def reviews(rng, rows, words):
+    picks = WORDS[rng.integers(0, len(WORDS), (rows, words))]
+    text = pd.Series(picks[:, 0], dtype="object")
+    for i in range(1, words):
+        # Mix in punctuation and casing for the text cleaning stage
+        sep = np.where(rng.random(rows) < 0.1, "! ", " ")
+        text = text + sep + picks[:, i]
+    capital = rng.random(rows) < 0.3
+    text[capital] = text[capital].str.capitalize()
+    return text
+
+def generate_chunk(rng, rows, start=0, products=None, extra_columns=0, nulls=0.0,
+                   duplicates=0.0, text_words=0, imbalance=None, classes=2):
+    products = products or max(rows, 1)
+    product = rng.integers(0, products, rows)
+    name = product % len(PRODUCT_NAMES)
+
+    opening = rng.integers(10, 81, rows)
+    purchased = rng.integers(0, 31, rows)
+    sold = np.minimum(rng.poisson(7, rows), opening + purchased)
+    in_stock = opening + purchased - sold
+    unit_cost = np.maximum(1, np.round(BASE_COSTS[name] * rng.lognormal(0, 0.1, rows))).astype(np.int64)
+
+    columns = {
+        PRODUCT_ID: pd.Series(product + 101).map("P{}".format),
+        PRODUCT_NAME: pd.Series(np.array(PRODUCT_NAMES, dtype=object)[name]),
+        OPENING: opening,
+        PURCHASED: purchased,
+        SOLD: sold,
+        IN_STOCK: in_stock,
+        UNIT_COST: unit_cost,
+        TOTAL_COST: unit_cost * in_stock,
+    }
+    for i in range(extra_columns):
+        columns[f"Metric {i + 1}"] = np.round(rng.normal(100, 25, rows), 2)
+    if text_words:
+        columns["Review"] = reviews(rng, rows, text_words)
+    if imbalance is not None:
+        labels = np.array(CLASS_LABELS[:classes], dtype=object)
+        columns["Label"] = labels[rng.choice(classes, rows, p=class_probabilities(imbalance, classes))]
+
+    df = pd.DataFrame(columns)
+
+    if nulls:
+        for col in df.columns:
+            if col == PRODUCT_ID:
+                continue
+            mask = rng.random(rows) < nulls
+            if mask.any():
+                if pd.api.types.is_integer_dtype(df[col]):
+                    df[col] = df[col].astype("float64")
+                df.loc[mask, col] = None
+
+    if duplicates and rows > 1:
+        # Overwrite a share of rows with copies of other rows in the chunk
+        targets = np.flatnonzero(rng.random(rows) < duplicates)
+        sources = rng.integers(0, rows, len(targets))
+        df.iloc[targets] = df.iloc[sources].to_numpy()
+
+    # Text columns as the CSV reader would type them
+    for col in df.select_dtypes(include=["object"]).columns:
+        df[col] = df[col].astype("str")
+
+    df.index = pd.RangeIndex(start, start + rows)
+    return df
+
+def generate_frames(rows, chunk_rows=1_000_000, seed=42, **options):
+    """The dataset as DataFrames of at most chunk_rows rows each."""
+    rng = np.random.default_rng(seed)
+    options.setdefault("products", max(rows // 4, 1))
+    for start in range(0, rows, chunk_rows):
+        yield generate_chunk(rng, min(chunk_rows, rows - start), start, **options)
+
+def generate_frame(rows, seed=42, **options):
+    return pd.concat(list(generate_frames(rows, seed=seed, **options)))
+
+def write_dataset(path, rows, chunk_rows=1_000_000, seed=42, **options):
+    """Write the dataset to path chunk by chunk; returns the path."""
+    writer = None
+    schema = None
+    try:
+        for df in generate_frames(rows, chunk_rows, seed, **options):
+            table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+            if writer is None:
+                # Later chunks may lack nulls in a column; keep the first chunk's types
+                schema = table.schema
+                if path.endswith(".csv"):
+                    writer = pa_csv.CSVWriter(path, schema)
+                elif path.endswith(".parquet"):
+                    writer = pq.ParquetWriter(path, schema)
+                else:
+                    writer = pa.ipc.new_file(path, schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+def add_options(parser):
+    parser.add_argument("--extra-columns", type=int, default=0, help="extra numeric columns beyond C.csv's eight")
+    parser.add_argument("--nulls", type=float, default=0.0, help="share of missing values per column")
+    parser.add_argument("--duplicates", type=float, default=0.0, help="share of rows that copy another row")
+    parser.add_argument("--text-words", type=int, default=0, help="words per row in a 'Review' text column (0 for none)")
+    parser.add_argument("--imbalance", type=float, default=None, help="share of the majority class in a 'Label' column")
+    parser.add_argument("--classes", type=int, default=2, help="number of classes in the 'Label' column")
+    parser.add_argument("--seed", type=int, default=42)
+
+def generator_options(args):
+    return {
+        "extra_columns": args.extra_columns,
+        "nulls": args.nulls,
+        "duplicates": args.duplicates,
+        "text_words": args.text_words,
+        "imbalance": args.imbalance,
+        "classes": args.classes,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=float, required=True)
+    parser.add_argument("--out", required=True, help="output file (.csv, .parquet or .arrow)")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    add_options(parser)
+    args = parser.parse_args()
+
+    write_dataset(args.out, int(args.rows), args.chunk_rows, args.seed, **generator_options(args))
+    print(f"Wrote {int(args.rows)} rows to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""Benchmarks for the analysis and cleaning engines.
+
+    python -m benchmarks.run --rows 10000 100000 1000000
+    python -m benchmarks.run --rows 100000 --suites ask --llm-latency 0.5
+    python -m benchmarks.run --rows 100000 --compare benchmarks/results/<earlier run>.json
+
+Run from the server directory. Datasets come from benchmarks.generate (see
+its options) and are held in memory, so the largest --rows must fit in RAM.
+Suites:
+
+  operators  every OPERATORS entry through run_plan, cold (empty dataset
+             cache) and warm (cache kept from a previous run)
+  cleaning   advanced_clean_dataframe for each problem type
+  ask        the full /ask request against a stubbed LLM planner, with the
+             per-stage split from the Server-Timing header
+
+Each case reports the median wall time over --repeat runs and the peak RSS
+growth during the runs. Results are written as JSON to benchmarks/results/
+(or --out); --compare prints the ratio against an earlier results file and
+exits non-zero when a case slowed down by more than --threshold.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import config
+from logger import log
+from benchmarks.generate import generate_frame, add_options, generator_options
+from services.data_service import clean_columns
+from services.chat_log_service import chat_logs
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+SUITES = ("operators", "cleaning", "ask")
+PROBLEM_TYPES = ("general", "sentiment_analysis", "classification", "binary_classification")
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+# Peak RSS is process-wide; that is what a benchmark, timing one case at a
+# time in its own process, wants to know
+
+def reset_peak_memory():
+    """Reset the process's peak RSS (Linux only); False when unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_memory_mb():
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def measure(fn, repeat):
+    """Median and minimum seconds of fn() over `repeat` runs, plus the peak
+    RSS growth (MB) above the memory in use before the runs."""
+    runs = []
+    reset_peak_memory()
+    before = rss_mb()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    peak = peak_memory_mb()
+
+    return {
+        "seconds": statistics.median(runs),
+        "min_seconds": min(runs),
+        "runs": runs,
+        "peak_memory_mb": round(peak - before, 1) if peak is not None and before is not None else None,
+    }
+
+def operator_plans(df):
+    """(name, plan) for every operator, against the generated columns."""
+    sold = next(c for c in df.columns if "Units Sold" in c)
+    stock = next(c for c in df.columns if "Hand In" in c)
+    product = df["Product ID"].iloc[len(df) // 2]
+
+    return [
+        ("argmax", {"operator": "argmax", "metric": sold, "group_by": "Product Name"}),
+        ("argmin", {"operator": "argmin", "metric": stock, "group_by": "Product Name"}),
+        ("lookup", {"operator": "lookup", "metric": sold, "filter": {"Product ID": product}}),
+        ("sum", {"operator": "sum", "metric": sold}),
+        ("mean", {"operator": "mean", "metric": stock}),
+        ("count", {"operator": "count", "metric": "Product ID"}),
+        ("groupby_sum", {"operator": "groupby_sum", "metric": sold, "group_by": "Product Name"}),
+        ("groupby_mean", {"operator": "groupby_mean", "metric": stock, "group_by": "Product Name"}),
+        ("groupby_count", {"operator": "groupby_count", "metric": "Product ID", "group_by": "Product Name"}),
+        ("top_k", {"operator": "top_k", "metric": sold, "group_by": "Product ID", "agg": "sum", "k": 5, "order": "desc"}),
+        ("sales_diagnostics", {"operator": "sales_diagnostics", "target": sold}),
+        ("sales_diagnostics_scenarios", {"operator": "sales_diagnostics", "target": sold, "scenarios": [0.05, -0.2, 0.5]}),
+        ("chat", {"operator": "chat", "reply": "Hello!"}),
+        ("clean", {"operator": "clean"}),
+    ]
+
+def bench_operators(df, repeat):
+    from services.analysis_service import run_plan
+    from services import model_service
+
+    results = []
+    for name, plan in operator_plans(df):
+        def cold():
+            model_service.model_cache.clear()
+            run_plan(plan, df, {})
+
+        cache = {"version": ("benchmark", len(df))}
+        run_plan(plan, df, cache)
+        results.append({"suite": "operators", "name": name, "mode": "cold", **measure(cold, repeat)})
+        results.append({"suite": "operators", "name": name, "mode": "warm", **measure(lambda: run_plan(plan, df, cache), repeat)})
+    return results
+
+def bench_cleaning(df, repeat):
+    from services.data_service import advanced_clean_dataframe
+
+    target = "Label" if "Label" in df.columns else None
+    results = []
+    for problem_type in PROBLEM_TYPES:
+        if problem_type.endswith("classification") and target is None:
+            continue
+        stages = {}
+
+        def clean():
+            _, report = advanced_clean_dataframe(df, target, problem_type)
+            for stage in report["stages"]:
+                stages.setdefault(stage["stage"], []).append(stage["seconds"])
+
+        result = measure(clean, repeat)
+        result["stages"] = {stage: statistics.median(s) for stage, s in stages.items()}
+        results.append({"suite": "cleaning", "name": problem_type, "mode": "advanced", **result})
+    return results
+
+def parse_server_timing(header):
+    timings = {}
+    for part in (header or "").split(","):
+        name, _, duration = part.strip().partition(";dur=")
+        if duration:
+            timings[name] = float(duration) / 1000
+    return timings
+
+def bench_ask(df, repeat, llm_latency):
+    """The /ask endpoint end to end, with the LLM planner replaced by a stub
+    that returns the benchmark's plan after llm_latency seconds."""
+    from fastapi.testclient import TestClient
+    import main
+    import state
+    from services import llm_service
+
+    plans = {f"benchmark {name}": plan for name, plan in operator_plans(df) if name != "clean"}
+
+    async def stub_llm(question, schema):
+        await asyncio.sleep(llm_latency)
+        return dict(plans[question])
+
+    original = llm_service.llm_build_plan, config.FAST_PATH_ENABLED, config.SERVER_TIMING
+    llm_service.llm_build_plan = stub_llm
+    # Questions must reach the planner, and responses report their stages
+    config.FAST_PATH_ENABLED = False
+    config.SERVER_TIMING = True
+
+    results = []
+    try:
+        with TestClient(main.app) as client:
+            state.set_df(df, "benchmark")
+
+            for question in plans:
+                for mode in ("llm", "cached"):
+                    stages = {}
+
+                    def ask():
+                        if mode == "llm":
+                            llm_service.plan_cache.clear()
+                        response = client.post("/ask", json={"question": question, "dataset_id": "benchmark"})
+                        response.raise_for_status()
+                        for stage, seconds in parse_server_timing(response.headers.get("server-timing")).items():
+                            stages.setdefault(stage, []).append(seconds)
+
+                    ask()  # Starts plan workers and fills the dataset cache
+                    stages.clear()
+                    result = measure(ask, repeat)
+                    result["stages"] = {stage: statistics.median(s) for stage, s in stages.items()}
+                    results.append({"suite": "ask", "name": question.split(" ", 1)[1], "mode": mode, **result})
+    finally:
+        llm_service.llm_build_plan, config.FAST_PATH_ENABLED, config.SERVER_TIMING = original
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment():
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pa.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "plan_workers": config.PLAN_WORKERS,
+    }
+
+def case_key(result):
+    return (result["suite"], result["name"], result["mode"], result["rows"])
+
+def compare(results, baseline_path, threshold):
+    """Print each case's time relative to the baseline; returns the regressions."""
+    with open(baseline_path) as fh:
+        baseline = {case_key(r): r for r in json.load(fh)["results"]}
+
+    regressions = []
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        before = baseline.get(case_key(result))
+        if before is None or not before["seconds"]:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append(result)
+        suite, name, mode, rows = case_key(result)
+        print(f"  {suite:<10} {name:<28} {mode:<8} {rows:>11} {before['seconds']:>9.4f}s -> {result['seconds']:>9.4f}s  x{ratio:.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=float, nargs="+", default=[1e4, 1e5])
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the stubbed LLM takes to plan")
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    # Benchmark datasets default to a noisy, cleanable shape
+    add_options(parser)
+    parser.set_defaults(nulls=0.02, duplicates=0.01, text_words=12, imbalance=0.85)
+    args = parser.parse_args()
+
+    # Expected noise such as "Mongo not configured" would drown the report
+    log.setLevel(logging.ERROR)
+    # The ask suite runs the app's startup, which clears EXPORT_DIR and
+    # recovers JOB_DIR, and persists the datasets it registers: point every
+    # directory the server writes to at a scratch one, never the real ones
+    scratch = tempfile.mkdtemp(prefix="vectora-bench-")
+    for setting in ("DATA_DIR", "UPLOAD_DIR", "JOB_DIR", "EXPORT_DIR"):
+        setattr(config, setting, os.path.join(scratch, setting.lower()))
+    chat_logs.spill_path = os.path.join(scratch, "chat_logs.spill.jsonl")
+
+    options = generator_options(args)
+    results = []
+    try:
+        for rows in (int(r) for r in args.rows):
+            df = clean_columns(generate_frame(rows, seed=args.seed, **options))
+            print(f"{rows} rows, {df.shape[1]} columns, {df.memory_usage(deep=True).sum() / 2**20:.0f} MB")
+
+            for suite in args.suites:
+                if suite == "operators":
+                    cases = bench_operators(df, args.repeat)
+                elif suite == "cleaning":
+                    cases = bench_cleaning(df, args.repeat)
+                else:
+                    cases = bench_ask(df, args.repeat, args.llm_latency)
+
+                for case in cases:
+                    case["rows"] = rows
+                    print(f"  {case['suite']:<10} {case['name']:<28} {case['mode']:<8} {case['seconds']:>9.4f}s  {case['peak_memory_mb']} MB")
+                results.extend(cases)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "generator": {**options, "seed": args.seed},
+        "repeat": args.repeat,
+        "llm_latency": args.llm_latency,
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nWrote {out}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -6,4 +6,123 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 API_BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8000")
 MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "vectora_db")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", 60_000))
+# How long a request waits for a free pooled connection before failing
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5_000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5_000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5_000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 20_000))
+
+# bcrypt cost (log2 rounds); stored hashes with another cost are rehashed at login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Threads hashing passwords, and how many more hashes may wait before
+# register/login answer 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(2, os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 32))
+# Register/login attempts allowed per email within the window
+LOGIN_RATE_LIMIT = int(os.getenv("LOGIN_RATE_LIMIT", 5))
+LOGIN_RATE_WINDOW_SECONDS = float(os.getenv("LOGIN_RATE_WINDOW_SECONDS", 60))
+
+# Page sizes for /users and /chats (default and the most a client may ask for)
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 200))
 CSV_PATH = "C2.csv"
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", 100_000))
+
+# Chat logs are written to Mongo in the background, in batches of up to
+# CHAT_LOG_BATCH_SIZE or every CHAT_LOG_FLUSH_SECONDS; records that cannot be
+# written go to CHAT_LOG_SPILL_PATH and are replayed later
+CHAT_LOG_BATCH_SIZE = int(os.getenv("CHAT_LOG_BATCH_SIZE", 100))
+CHAT_LOG_FLUSH_SECONDS = float(os.getenv("CHAT_LOG_FLUSH_SECONDS", 1.0))
+CHAT_LOG_QUEUE_SIZE = int(os.getenv("CHAT_LOG_QUEUE_SIZE", 10_000))
+CHAT_LOG_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_LOG_ENQUEUE_TIMEOUT_SECONDS", 0.05))
+CHAT_LOG_DRAIN_TIMEOUT_SECONDS = float(os.getenv("CHAT_LOG_DRAIN_TIMEOUT_SECONDS", 10))
+CHAT_LOG_REPLAY_SECONDS = float(os.getenv("CHAT_LOG_REPLAY_SECONDS", 30))
+CHAT_LOG_SPILL_PATH = os.getenv("CHAT_LOG_SPILL_PATH", "chat_logs.spill.jsonl")
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Latency histogram buckets in seconds, and whether responses carry a
+# Server-Timing header with the request's stage timings
+METRICS_BUCKETS = [
+    float(b) for b in os.getenv("METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60,120").split(",")
+]
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+STORE_BATCH_ROWS = int(os.getenv("STORE_BATCH_ROWS", 64 * 1024))
+DATASET_MEMORY_BUDGET_MB = int(os.getenv("DATASET_MEMORY_BUDGET_MB", 2048))
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", 1024))
+PLAN_CACHE_TTL_SECONDS = int(os.getenv("PLAN_CACHE_TTL_SECONDS", 24 * 60 * 60))
+PLAN_CACHE_MONGO = os.getenv("PLAN_CACHE_MONGO", "false").lower() == "true"
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 16))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 30))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", 5))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", 0.5))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", 8))
+
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", 0.8))
+
+SCHEMA_TOKEN_BUDGET = int(os.getenv("SCHEMA_TOKEN_BUDGET", 1500))
+SCHEMA_SAMPLE_ROWS = int(os.getenv("SCHEMA_SAMPLE_ROWS", 1000))
+SCHEMA_MAX_VALUES = int(os.getenv("SCHEMA_MAX_VALUES", 3))
+SCHEMA_MAX_TEXT_CHARS = int(os.getenv("SCHEMA_MAX_TEXT_CHARS", 40))
+
+GROUPBY_DEFAULT_K = int(os.getenv("GROUPBY_DEFAULT_K", 10))
+
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", 32))
+MODEL_CHUNK_ROWS = int(os.getenv("MODEL_CHUNK_ROWS", 100_000))
+
+WHATIF_MAX_SCENARIOS = int(os.getenv("WHATIF_MAX_SCENARIOS", 8))
+
+# Worker processes for CPU-heavy plan operators; 0 runs every plan in the threadpool
+PLAN_WORKERS = int(os.getenv("PLAN_WORKERS", min(4, os.cpu_count() or 1)))
+PLAN_TIMEOUT_SECONDS = float(os.getenv("PLAN_TIMEOUT_SECONDS", 120))
+# Per-operator overrides, e.g. "clean=300,sales_diagnostics=60"
+PLAN_OPERATOR_TIMEOUTS = {
+    name.strip(): float(seconds)
+    for name, seconds in (
+        item.split("=", 1) for item in os.getenv("PLAN_OPERATOR_TIMEOUTS", "clean=300").split(",") if "=" in item
+    )
+}
+
+JOB_DIR = os.getenv("JOB_DIR", "jobs")
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", 24 * 60 * 60))
+JOB_CLEANUP_INTERVAL_SECONDS = int(os.getenv("JOB_CLEANUP_INTERVAL_SECONDS", 10 * 60))
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 50_000))
+
+# How binary_classification cleaning rebalances an imbalanced target:
+# "undersample" the majority class or "oversample" the minority class
+CLASS_BALANCE_MODE = os.getenv("CLASS_BALANCE_MODE", "undersample").lower()
+# classification (multi-class) cleaning only reports the class distribution
+# unless this is on; then it rebalances the target the same way
+CLASS_BALANCE_MULTICLASS = os.getenv("CLASS_BALANCE_MULTICLASS", "false").lower() == "true"
+
+NLP_SAMPLE_ROWS = int(os.getenv("NLP_SAMPLE_ROWS", 10_000))
+NLP_CHUNK_ROWS = int(os.getenv("NLP_CHUNK_ROWS", 200_000))
+NLP_WORKERS = int(os.getenv("NLP_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Streaming sketches instead of exact value counts: "auto" uses them for
+# columns with at least SKETCH_MIN_ROWS rows, "on" always, "off" never
+SKETCH_MODE = os.getenv("SKETCH_MODE", "off").lower()
+SKETCH_MIN_ROWS = int(os.getenv("SKETCH_MIN_ROWS", 5_000_000))
+SKETCH_CHUNK_ROWS = int(os.getenv("SKETCH_CHUNK_ROWS", 1_000_000))
+SKETCH_EPSILON = float(os.getenv("SKETCH_EPSILON", 0.0001))
+SKETCH_DELTA = float(os.getenv("SKETCH_DELTA", 0.01))
+SKETCH_HEAVY_HITTERS = int(os.getenv("SKETCH_HEAVY_HITTERS", 32))
+SKETCH_HLL_ERROR = float(os.getenv("SKETCH_HLL_ERROR", 0.01))
+SKETCH_TDIGEST_COMPRESSION = float(os.getenv("SKETCH_TDIGEST_COMPRESSION", 200))
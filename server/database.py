@@ -1,31 +1,66 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
 import config
+from logger import log
+
+# (collection, keys, options) created at startup; create_index is a no-op
+# for indexes that already exist
+INDEXES = [
+    # Register and login look users up by email; /users pages through it in order
+    ("ai.Users", [("email", ASCENDING)], {"unique": True, "name": "email_unique"}),
+    # Chat history: one user's chats, newest first, with _id breaking ties
+    ("chats", [("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {"name": "user_timestamp"}),
+    # Persisted plans are removed by Mongo once expires_at passes
+    ("plan_cache", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0, "name": "expires_at_ttl"}),
+]
 
 class Database:
     client: AsyncIOMotorClient = None
 
     async def connect(self):
         if not config.MONGO_URI:
-            print("MONGO_URI not found in environment variables")
+            log.warning("MONGO_URI not found in environment variables")
             return
         
         try:
-            self.client = AsyncIOMotorClient(config.MONGO_URI)
+            self.client = AsyncIOMotorClient(
+                config.MONGO_URI,
+                maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+                minPoolSize=config.MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=config.MONGO_MAX_IDLE_MS,
+                waitQueueTimeoutMS=config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                connectTimeoutMS=config.MONGO_CONNECT_TIMEOUT_MS,
+                serverSelectionTimeoutMS=config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                socketTimeoutMS=config.MONGO_SOCKET_TIMEOUT_MS
+            )
             # Verify connection
             await self.client.admin.command('ping')
-            print("Connected to MongoDB")
+            log.info("Connected to MongoDB")
         except Exception as e:
-            print(f"Error connecting to MongoDB: {e}")
+            log.error("Error connecting to MongoDB: %s", e)
             self.client = None
+            return
+
+        await self.ensure_indexes()
+
+    async def ensure_indexes(self):
+        database = self.get_db()
+        for collection, keys, options in INDEXES:
+            try:
+                await database[collection].create_index(keys, **options)
+            except PyMongoError as e:
+                # e.g. existing duplicate emails block the unique index; keep serving
+                log.error("Could not create index %s on %s: %s", options["name"], collection, e)
 
     def close(self):
         if self.client:
             self.client.close()
-            print("Closed MongoDB connection")
+            log.info("Closed MongoDB connection")
 
-    def get_db(self, db_name="vectora_db"):
+    def get_db(self, db_name=None):
         if self.client:
-            return self.client[db_name]
+            return self.client[db_name or config.MONGO_DB_NAME]
         return None
 
 db = Database()
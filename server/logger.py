@@ -0,0 +1,27 @@
+import sys
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import config
+
+# Records are handed to a queue and written to stderr by a listener thread,
+# so logging from the event loop never blocks on the stream.
+
+log = logging.getLogger("vectora")
+
+def setup_logging():
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+
+    log.addHandler(QueueHandler(records))
+    log.setLevel(config.LOG_LEVEL)
+    log.propagate = False
+
+setup_logging()
@@ -1,23 +1,119 @@
+import time
+import asyncio
 import uvicorn
 import pandas as pd
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routers import data, auth
+from routers import data, auth, metrics
 import config
 import state
-from services.data_service import clean_columns, clean_dataframe
+from services.data_service import clean_columns
+from services.llm_service import close_client
+from services.executor_service import close_workers
+from services.job_service import recover_jobs, cleanup_jobs
+from services.export_service import clear_artifacts
 from database import db
+from services import metrics_service
+from services.chat_log_service import chat_logs
+from services.auth_service import close_executor
+from logger import log
 
 app = FastAPI()
 
+def load_datasets():
+    clear_artifacts()
+    # Register datasets persisted by a previous run; load the initial CSV as the default one if needed
+    try:
+        restored = state.restore()
+        if restored:
+            log.info("Restored %d persisted dataset(s) from %s", restored, config.DATA_DIR)
+        if not state.has_data(state.DEFAULT_DATASET):
+            df = pd.read_csv(config.CSV_PATH)
+            if df is not None:
+                df = clean_columns(df)
+                df = df.drop("Unnamed: 0", axis=1, errors='ignore')
+                df = df.drop("Unnamed: 17", axis=1, errors='ignore')
+                df = df.dropna()
+                state.set_df(df)
+                log.info("Loaded initial data from %s", config.CSV_PATH)
+    except FileNotFoundError:
+        log.warning("Initial CSV not found. Waiting for upload.")
+        state.set_df(None)
+    except Exception as e:
+        log.error("Error loading initial CSV: %s", e)
+        state.set_df(None)
+
+# Run at startup rather than import so plan worker processes, which
+# re-import this module, do not load data themselves
+@app.on_event("startup")
+async def startup_datasets():
+    load_datasets()
+
+async def cleanup_jobs_periodically():
+    while True:
+        removed = await asyncio.to_thread(cleanup_jobs)
+        if removed:
+            log.info("Removed %d expired job(s)", removed)
+        await asyncio.sleep(config.JOB_CLEANUP_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+async def startup_jobs():
+    interrupted = recover_jobs()
+    if interrupted:
+        log.warning("Marked %d interrupted job(s) as failed", interrupted)
+    app.state.job_cleanup = asyncio.create_task(cleanup_jobs_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_jobs():
+    app.state.job_cleanup.cancel()
+
 @app.on_event("startup")
 async def startup_db_client():
     await db.connect()
 
+@app.on_event("startup")
+async def startup_chat_logs():
+    chat_logs.start()
+
+# Registered before the database shutdown so queued chat logs are written first
+@app.on_event("shutdown")
+async def shutdown_chat_logs():
+    await chat_logs.close()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     db.close()
 
+@app.on_event("shutdown")
+async def shutdown_llm_client():
+    await close_client()
+
+@app.on_event("shutdown")
+async def shutdown_password_hashing():
+    close_executor()
+
+@app.on_event("shutdown")
+async def shutdown_plan_workers():
+    close_workers()
+
+@app.middleware("http")
+async def record_request(request: Request, call_next):
+    timings = metrics_service.start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    # Label by route template rather than raw path to bound cardinality
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics_service.inc("vectora_http_requests_total", method=request.method, path=path, status=response.status_code)
+    metrics_service.observe("vectora_http_request_seconds", elapsed, path=path)
+
+    if config.SERVER_TIMING:
+        response.headers["Server-Timing"] = metrics_service.server_timing(timings + [("total", elapsed)])
+        response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -28,23 +124,7 @@ app.add_middleware(
 
 app.include_router(data.router)
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
-
-# Attempt to load initial data
-try:
-    df = pd.read_csv(config.CSV_PATH)
-    if df is not None:
-        df = clean_columns(df)
-        df = df.drop("Unnamed: 0", axis=1, errors='ignore')
-        df = df.drop("Unnamed: 17", axis=1, errors='ignore')
-        df = df.dropna()
-        state.set_df(df)
-        print(f"Loaded initial data from {config.CSV_PATH}")
-except FileNotFoundError:
-    print("Warning: Initial CSV not found. Waiting for upload.")
-    state.set_df(None)
-except Exception as e:
-    print(f"Error loading initial CSV: {e}")
-    state.set_df(None)
+app.include_router(metrics.router)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
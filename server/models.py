@@ -6,6 +6,7 @@ class QueryRequest(BaseModel):
     question: str
     visualize: bool = False
     user_id: Optional[str] = None
+    dataset_id: Optional[str] = None
 
 class User(BaseModel):
     email: str
@@ -1,36 +1,55 @@
-from fastapi import APIRouter, HTTPException, Body
-from passlib.context import CryptContext
+from fastapi import APIRouter, HTTPException
 from models import User, UserRegister, UserLogin
+from pymongo.errors import DuplicateKeyError
 from database import db
+from logger import log
+from services import metrics_service
+from services.auth_service import (
+    hash_password, verify_password, HashQueueFull, login_limiter, limiter_key
+)
 from datetime import datetime
 
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def check_rate_limit(action, email):
+    retry_after = login_limiter.hit(limiter_key(action, email))
+    if retry_after:
+        metrics_service.inc("vectora_auth_rate_limited_total", action=action)
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts. Please wait a moment and try again.",
+            headers={"Retry-After": str(int(retry_after) + 1)}
+        )
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+def server_busy():
+    return HTTPException(
+        status_code=503,
+        detail="The server is busy. Please try again in a moment.",
+        headers={"Retry-After": "1"}
+    )
 
 @router.post("/register")
 async def register(user: UserRegister):
+    check_rate_limit("register", user.email)
     try:
         users_collection = db.get_db()["ai.Users"]
         
-        existing_user = await users_collection.find_one({"email": user.email})
+        existing_user = await users_collection.find_one({"email": user.email}, {"_id": 1})
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already registered")
         
         new_user = User(
             email=user.email,
             username=f"{user.first_name} {user.last_name}",
-            password_hash=get_password_hash(user.password),
+            password_hash=await hash_password(user.password),
             created_at=datetime.utcnow()
         )
         
-        result = await users_collection.insert_one(new_user.dict())
+        try:
+            result = await users_collection.insert_one(new_user.dict())
+        except DuplicateKeyError:
+            # Registered concurrently; the unique email index rejected the second insert
+            raise HTTPException(status_code=400, detail="Email already registered")
         
         return {
             "message": "User registered successfully",
@@ -38,22 +57,36 @@ async def register(user: UserRegister):
         }
     except HTTPException:
         raise
+    except HashQueueFull:
+        raise server_busy()
     except Exception as e:
-        print(f"[!] Database Error in /register: {e}")
+        log.error("Database error in /register: %s", e)
         raise HTTPException(status_code=503, detail="Database connection unavailable")
 
 @router.post("/login")
 async def login(credentials: UserLogin):
+    check_rate_limit("login", credentials.email)
     try:
         users_collection = db.get_db()["ai.Users"]
         
-        user = await users_collection.find_one({"email": credentials.email})
+        user = await users_collection.find_one(
+            {"email": credentials.email}, {"password_hash": 1, "username": 1, "email": 1}
+        )
         if not user:
             raise HTTPException(status_code=400, detail="Invalid email or password")
             
-        if not verify_password(credentials.password, user.get("password_hash")):
+        matches, new_hash = await verify_password(credentials.password, user.get("password_hash"))
+        if not matches:
             raise HTTPException(status_code=400, detail="Invalid email or password")
-            
+
+        login_limiter.reset(limiter_key("login", credentials.email))
+        if new_hash:
+            # Stored with other bcrypt parameters than BCRYPT_ROUNDS: upgrade it now that we know the password
+            try:
+                await users_collection.update_one({"_id": user["_id"]}, {"$set": {"password_hash": new_hash}})
+            except Exception as e:
+                log.warning("Could not rehash password for user %s: %s", user["_id"], e)
+
         return {
             "message": "Login successful",
             "user_id": str(user["_id"]),
@@ -62,6 +95,8 @@ async def login(credentials: UserLogin):
         }
     except HTTPException:
         raise
+    except HashQueueFull:
+        raise server_busy()
     except Exception as e:
-        print(f"[!] Database Error in /login: {e}")
+        log.error("Database error in /login: %s", e)
         raise HTTPException(status_code=503, detail="Database connection unavailable")
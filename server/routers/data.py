@@ -1,154 +1,262 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from fastapi.responses import FileResponse
-import pandas as pd
-import io
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+import os
+from urllib.parse import urlencode
 import state
 import config
-from models import QueryRequest
-from services.data_service import (
-    clean_columns, clean_dataframe, advanced_clean_dataframe, build_column_schema
-)
+from models import QueryRequest, ChatLog
+from services.data_service import clean_dataframe
 from services.analysis_service import (
-    run_plan, build_api_response, explain_data_cleaning
+    OPERATORS, plan_columns, build_api_response
 )
 from services.llm_service import (
-    llm_build_plan
+    build_plan
 )
+from services.ingest_service import spool_upload, ingest_file
+from services.job_service import create_job, get_job, result_path
+from services.clean_service import run_clean_job
+from services.export_service import negotiate, export_response, dataset_artifact, artifact_suffix
+from services import store_service
+from services.executor_service import execute_plan, PlanCancelled
+from services import metrics_service
+from services.chat_log_service import chat_logs
+from services import user_service
+from services.metrics_service import span
+from logger import log
 
 router = APIRouter()
 
-@router.post("/clean")
-def clean_data():
-    df = state.get_df()
-
-    if df is None:
+def require_dataset(dataset_id, user_id):
+    dataset = state.get_dataset(dataset_id, user_id)
+    if dataset is None:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    if not dataset.has_data():
         raise HTTPException(status_code=400, detail="No data loaded")
+    return dataset
 
-    cleaned_df = clean_dataframe(df)
-
-    output_path = "cleaned_data.csv"
-    cleaned_df.to_csv(output_path, index=False)
+def export_format(request, format, compression):
+    try:
+        return negotiate(format, compression, request.headers.get("accept"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return FileResponse(
-        output_path,
-        filename="cleaned_data.csv",
-        media_type="text/csv"
+@router.post("/clean")
+def clean_data(
+    request: Request,
+    dataset_id: str = state.DEFAULT_DATASET,
+    user_id: str | None = None,
+    format: str | None = None,
+    compression: str | None = None
+):
+    dataset = require_dataset(dataset_id, user_id)
+    format, compression = export_format(request, format, compression)
+
+    def cleaned_frame():
+        with state.acquire(dataset.id):
+            return clean_dataframe(state.get_df(dataset.id))
+
+    return export_response(
+        cleaned_frame, dataset_artifact(dataset, "clean", format, compression),
+        "cleaned_data", format, compression
     )
 
-@router.post("/clean/advanced")
-def advanced_clean(target: str | None = None, problem_type: str = "general"):
-    df = state.get_df()
-
-    if df is None:
-        raise HTTPException(status_code=400, detail="No data loaded")
-
-    cleaned_df, report = advanced_clean_dataframe(df, target, problem_type)
-
-    output_path = "cleaned_advanced.csv"
-    cleaned_df.to_csv(output_path, index=False)
-
-    explanation = explain_data_cleaning(report)
+@router.post("/clean/advanced", status_code=202)
+async def advanced_clean(
+    target: str | None = None,
+    problem_type: str = "general",
+    dataset_id: str = state.DEFAULT_DATASET,
+    user_id: str | None = None
+):
+    dataset = require_dataset(dataset_id, user_id)
+
+    job = create_job(
+        "clean", dataset_id=dataset.id, owner=user_id,
+        target=target, problem_type=problem_type
+    )
+    track(asyncio.create_task(run_clean_job(job["id"], dataset, target, problem_type)))
 
     return {
-        "message": "Data cleaned using analyst-grade logic",
-        "summary": explanation,
-        "report": report,
-        "download": "/download/advanced"
+        "message": "Cleaning started",
+        "job_id": job["id"],
+        "status_url": f"/jobs/{job['id']}"
     }
 
 @router.get("/download/advanced")
-def download_advanced():
-    return FileResponse(
-        "cleaned_advanced.csv",
-        filename="cleaned_advanced.csv",
-        media_type="text/csv"
+def download_advanced(
+    request: Request,
+    job_id: str,
+    user_id: str | None = None,
+    format: str | None = None,
+    compression: str | None = None
+):
+    job = get_job(job_id)
+    if job is None or job["kind"] != "clean" or job.get("owner") not in (None, user_id):
+        raise HTTPException(status_code=404, detail="No cleaned data available")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Cleaning is {job['status']}")
+
+    cleaned_path = result_path(job_id, ".arrow")
+    if not os.path.exists(cleaned_path):
+        raise HTTPException(status_code=404, detail="Cleaned data has expired")
+
+    format, compression = export_format(request, format, compression)
+    return export_response(
+        lambda: store_service.load_dataset(cleaned_path),
+        result_path(job_id, ".export" + artifact_suffix(format, compression)),
+        "cleaned_advanced", format, compression
     )
 
-@router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+# Keep references to running background tasks so they are not garbage collected
+background_tasks = set()
+
+def track(task):
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+@router.post("/upload", status_code=202)
+async def upload_file(
+    file: UploadFile = File(...),
+    user_id: str | None = Form(None),
+    dataset_id: str | None = Form(None),
+    mode: str = Form("replace")
+):
+    if mode not in ("replace", "append"):
+        raise HTTPException(status_code=400, detail="mode must be 'replace' or 'append'")
+
+    if dataset_id is not None:
+        # Re-uploading into an existing dataset replaces it or appends to it
+        dataset = state.get_dataset(dataset_id, user_id)
+        if dataset is None:
+            raise HTTPException(status_code=404, detail="Dataset not found")
+        if not state.can_write(dataset, user_id):
+            raise HTTPException(status_code=403, detail="Shared datasets are read-only; upload without a dataset_id to get your own")
+    elif mode == "append":
+        raise HTTPException(status_code=400, detail="Appending needs a dataset_id")
+    else:
+        dataset_id = state.new_dataset_id()
+
     try:
-        contents = await file.read()
-        
-        if file.filename.endswith('.csv'):
-            current_df = pd.read_csv(io.BytesIO(contents))
-        elif file.filename.endswith(('.xls', '.xlsx')):
-            current_df = pd.read_excel(io.BytesIO(contents))
-        else:
-            # Try CSV default, if fail then error
-             current_df = pd.read_csv(io.BytesIO(contents))
-
-        # Preprocessing
-        current_df = clean_columns(current_df)
-        
-        # Mimic the cleaning steps from the script
-        current_df = current_df.drop("Unnamed: 0", axis=1, errors='ignore')
-        current_df = current_df.drop("Unnamed: 17", axis=1, errors='ignore')
-        current_df = current_df.dropna()
-        
-        state.set_df(current_df)
-        
-        return {
-            "message": "File uploaded and processed successfully",
-            "columns": list(current_df.columns),
-            "rows": len(current_df)
-        }
+        path = await run_in_threadpool(spool_upload, file.file, file.filename)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
 
+    job = create_job("upload", filename=file.filename, dataset_id=dataset_id, owner=user_id)
+
+    track(asyncio.create_task(
+        run_in_threadpool(
+            ingest_file, job["id"], path, file.filename, dataset_id, user_id, mode == "append"
+        )
+    ))
+
+    return {
+        "message": "File received, processing started",
+        "job_id": job["id"],
+        "dataset_id": dataset_id,
+        "status_url": f"/jobs/{job['id']}"
+    }
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str, user_id: str | None = None):
+    job = get_job(job_id)
+    if job is None or job.get("owner") not in (None, user_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.get("/download")
-def download_csv():
-    df = state.get_df()
-    if df is None:
+def download_csv(
+    request: Request,
+    dataset_id: str = state.DEFAULT_DATASET,
+    user_id: str | None = None,
+    format: str | None = None,
+    compression: str | None = None
+):
+    dataset = state.get_dataset(dataset_id, user_id)
+    if dataset is None or not dataset.has_data():
         raise HTTPException(status_code=400, detail="No data available")
-    
-    # Save to a temporary file
-    temp_file = "download_data.csv"
-    df.to_csv(temp_file, index=False)
-    return FileResponse(temp_file, filename="data.csv", media_type='text/csv')
 
-from database import db
-from models import QueryRequest, User, ChatLog
-from fastapi.concurrency import run_in_threadpool
-
-# ... (imports remain)
+    format, compression = export_format(request, format, compression)
+    return export_response(
+        lambda: state.get_df(dataset.id), dataset_artifact(dataset, "data", format, compression),
+        "data", format, compression
+    )
 
 @router.get("/users")
-async def list_users():
+async def list_users(limit: int = None, after: str = None):
+    """Users' emails and names, a page at a time in email order: pass the
+    returned next_cursor as `after` to get the next page."""
     try:
-        users_cursor = db.get_db()["ai.Users"].find()
-        users = await users_cursor.to_list(length=100)
-        # Convert ObjectId to str if needed, for now just return basic list handles
-        for user in users:
-            user["_id"] = str(user["_id"])
-        return users
+        users, next_cursor = await user_service.list_users(limit, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"[!] Database Error in /users: {e}")
-        # Return empty list or 503 depending on preference, but for frontend stability often empty list is safer if not critical
-        return []
+        log.error("Database error in /users: %s", e)
+        # Return an empty page rather than an error; the list is not critical for the frontend
+        return {"users": [], "next_cursor": None}
+    return {"users": users, "next_cursor": next_cursor}
+
+@router.get("/chats")
+async def list_chats(user_id: str, limit: int = None, before: str = None):
+    """The caller's own questions and answers, newest first. user_id is the
+    caller's, as sent with /ask; only chats logged under it are returned.
+    Pass the returned next_cursor as `before` for older ones."""
+    try:
+        chats, next_cursor = await user_service.chat_history(user_id, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.error("Database error in /chats: %s", e)
+        raise HTTPException(status_code=503, detail="Database connection unavailable")
+    return {"chats": chats, "next_cursor": next_cursor}
 
 @router.post("/ask")
-async def ask_endpoint(request: QueryRequest):
-    df = state.get_df()
-    if df is None:
+async def ask_endpoint(request: QueryRequest, http_request: Request):
+    dataset = state.get_dataset(request.dataset_id, request.user_id)
+    if dataset is None or not dataset.has_data():
         raise HTTPException(status_code=400, detail="No data loaded. Please upload a CSV file first.")
 
     question = request.question
-    print(f"\n[?] Question: {question}")
+    log.info("Question: %s", question)
 
     vis_keywords = ["visualize", "visualise", "visualisation", "plot", "chart", "graph", "histogram", "scatter", "bar", "pie"]
     if any(keyword in question.lower() for keyword in vis_keywords):
         request.visualize = True
 
 
-    schema = build_column_schema(df)
+    with span("schema"):
+        schema = await run_in_threadpool(state.get_schema, dataset.id)
     try:
-        plan = await run_in_threadpool(llm_build_plan, question, schema)
-        print("[!] Plan:", plan)
+        with span("plan"):
+            plan, planner = await build_plan(question, schema)
+        log.info("Plan (%s): %s", planner, plan)
+
+        operator = plan.get("operator")
+        if operator == "clean" and not state.can_write(dataset, request.user_id):
+            return {
+                "answer": "This dataset is shared and can't be changed. Upload your own copy of it to clean it.",
+                "planner": planner
+            }
+
+        with span("execute") as execution, state.acquire(dataset.id):
+            # Take the cache before the frame so a concurrent set_df can never
+            # pair the new version's cache with the old frame
+            cache = dataset.cache
+            result = await execute_plan(
+                plan, dataset, cache, plan_columns(plan, schema["columns"]),
+                is_disconnected=http_request.is_disconnected
+            )
+        # The operator comes from the LLM's plan: unknown names share one label
+        label = operator if isinstance(operator, str) and operator in OPERATORS else "other"
+        metrics_service.observe("vectora_operator_seconds", execution.seconds, operator=label)
 
-        result = await run_in_threadpool(run_plan, plan, df)
-        
         if result.get("analysis") == "clean" and "new_df" in result:
-            state.set_df(result.pop("new_df"))
+            with span("store"):
+                await run_in_threadpool(
+                    state.set_df, result.pop("new_df"), dataset.id, dataset.owner
+                )
+        elif result.get("analysis") == "clean" and "new_source" in result:
+            with span("store"):
+                await run_in_threadpool(state.replace_source, result.pop("new_source"), dataset.id)
 
     
         response = build_api_response(result, request.visualize)
@@ -160,15 +268,17 @@ async def ask_endpoint(request: QueryRequest):
              rephrased_answer += "\n\nYou can see a visualization of the chart [here](/chat/visualize)."
              
         if result.get("analysis") == "clean":
-             rephrased_answer += f"\n\n[Download Cleaned Data]({config.API_BASE_URL}/download)"
+             query = urlencode({"dataset_id": dataset.id, "user_id": request.user_id})
+             rephrased_answer += f"\n\n[Download Cleaned Data]({config.API_BASE_URL}/download?{query})"
 
         response["answer"] = rephrased_answer
+        response["planner"] = planner
 
         
         if not request.visualize:
             response.pop("charts", None)
 
-        print("[=] Answer:", rephrased_answer)
+        log.info("Answer: %s", rephrased_answer)
 
         try:
             chat_log = ChatLog(
@@ -176,19 +286,25 @@ async def ask_endpoint(request: QueryRequest):
                 question=question,
                 answer=rephrased_answer
             )
-            await db.get_db()["chats"].insert_one(chat_log.dict())
-            print("Chat saved to DB")
+            # Only queued here; chat_log_service writes it to Mongo in the background
+            with span("chat_log"):
+                await chat_logs.enqueue(chat_log.dict())
         except Exception as db_e:
-            print(f"Failed to save chat to DB: {db_e}")
+            log.warning("Failed to save chat to DB: %s", db_e)
 
         return response
 
+    except PlanCancelled:
+        log.info("Client disconnected, plan cancelled: %s", question)
+        return None
+    except asyncio.TimeoutError as e:
+        log.warning("Plan timed out: %s", e)
+        raise HTTPException(status_code=504, detail="The analysis took too long. Try a narrower question.")
     except ValueError as e:
-        print(f"[!] Validation/LLM Error: {e}")
+        log.warning("Validation/LLM error: %s", e)
         return {
             "answer": f"I couldn't process your request: {str(e)}. Please try rephrasing or asking about existing columns."
         }
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        log.exception("Error answering question: %s", question)
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services import metrics_service
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(
+        metrics_service.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,67 +1,127 @@
 import pandas as pd
-import re
-from sklearn.linear_model import LinearRegression
-from services.data_service import resolve_sales_column, clean_dataframe, advanced_clean_dataframe
+import numpy as np
+import config
+from services.data_service import resolve_sales_column, advanced_clean_dataframe
+from services.stats_service import column_stats, running_totals, tally_frames, totals_means
+from services.index_service import filter_positions
+from services.groupby_service import group_by_metric
+from services.model_service import fit_linear_model
+from services import store_service
+from services.metrics_service import span
 
 def get_numeric_features(df, target):
     numeric_cols = df.select_dtypes(include=["number"]).columns.tolist()
     return [c for c in numeric_cols if c != target]
 
 
-def train_sales_model(df, target):
+def train_sales_model(df, target, cache=None):
     features = get_numeric_features(df, target)
 
-    X = df[features].fillna(0)
-    y = df[target]
-
-    model = LinearRegression()
-    model.fit(X, y)
+    model = fit_linear_model(df, target, features, cache)
 
     return features, model.coef_, model
 
 
-def simulate_changes(df, target, model, features):
-    base = df[features].mean().values.reshape(1, -1)
-    base_pred = model.predict(base)[0]
+def feature_means(df, features, cache=None):
+    if cache is None:
+        return df[features].mean().to_numpy(dtype="float64")
+    return np.array([column_stats(df, f, cache)["mean"] for f in features], dtype="float64")
 
-    impacts = []
+def what_if(model, base, changes):
+    """Change in prediction for every (feature, relative change) pair.
 
-    for i, feat in enumerate(features):
-        modified = base.copy()
-        modified[0][i] *= 1.10  # +10%
+    Each scenario scales a single feature of the base point, so the batch of
+    perturbed rows is diagonal in the features and all predictions collapse
+    into one outer product: delta[i, j] = coef[i] * base[i] * changes[j].
+    """
+    return np.outer(model.coef_ * base, np.asarray(changes, dtype="float64"))
 
-        new_pred = model.predict(modified)[0]
+def rank_impacts(features, deltas):
+    order = np.argsort(-deltas, kind="stable")
+    return [
+        {"feature": features[i], "delta_sales": round(float(deltas[i]), 2)}
+        for i in order
+    ]
 
-        impacts.append({
-            "feature": feat,
-            "delta_sales": round(new_pred - base_pred, 2)
-        })
+def rank_scenarios(model, features, base, changes):
+    deltas = what_if(model, base, changes)
+    return {
+        change: rank_impacts(features, deltas[:, j])
+        for j, change in enumerate(changes)
+    }
 
-    return sorted(impacts, key=lambda x: x["delta_sales"], reverse=True)
+def parse_scenarios(plan):
+    scenarios = plan.get("scenarios") or []
+    if not isinstance(scenarios, list):
+        raise ValueError("scenarios must be a list of relative changes such as 0.05 or -0.2")
 
+    changes = []
+    for value in scenarios[:config.WHATIF_MAX_SCENARIOS]:
+        try:
+            changes.append(float(value))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid scenario: {value}")
+    return changes
 
-def sales_diagnostics(df, plan):
-    target = plan.get("target")
+def diagnostics_result(target, features, model, base, scenarios):
+    impacts = rank_scenarios(model, features, base, [0.10, *scenarios])
 
-    if target not in df.columns:
-        target = resolve_sales_column(df)
-
-    features, coefs, model = train_sales_model(df, target)
-    impacts = simulate_changes(df, target, model, features)
-
-    return {
+    result = {
         "analysis": "sales_diagnostics",
         "target": target,
         "top_drivers": [
             {"feature": f, "coefficient": round(c, 3)}
-            for f, c in zip(features, coefs)
+            for f, c in zip(features, model.coef_)
         ],
-        "recommended_actions": impacts[:3]
+        "recommended_actions": impacts[0.10][:3]
     }
 
-def extract_product_id(question):
-    match = re.search(r"\bP\d+\b", question.upper())
-    return match.group(0) if match else None
+    if scenarios:
+        result["scenarios"] = [
+            {"change": change, "impacts": impacts[change][:3]}
+            for change in scenarios
+        ]
+
+    return result
+
+def sales_diagnostics(df, plan, cache=None):
+    target = plan.get("target")
+
+    if target not in df.columns:
+        target = resolve_sales_column(df)
+
+    features, coefs, model = train_sales_model(df, target, cache)
+    base = feature_means(df, features, cache)
+
+    return diagnostics_result(target, features, model, base, parse_scenarios(plan))
+
+def stream_sales_diagnostics(source, plan, cache):
+    """sales_diagnostics over the on-disk dataset, one record batch at a time,
+    so memory stays bounded by STORE_BATCH_ROWS whatever the dataset size."""
+    empty = store_service.empty_frame(source)
+
+    target = plan.get("target")
+    if target not in empty.columns:
+        target = resolve_sales_column(empty)
+
+    features = get_numeric_features(empty, target)
+
+    # Feature means are tallied in the same pass that fits the model
+    totals = running_totals(features)
+    frames = tally_frames(store_service.iter_frames(source, [*features, target]), features, totals)
+    model = fit_linear_model(None, target, features, cache, frames=frames)
+
+    means = cache.setdefault("column_means", {})
+    if any(f not in means for f in features):
+        if not totals["done"]:
+            # The fit came from the model cache (or only read appended rows)
+            totals = running_totals(features)
+            for _ in tally_frames(store_service.iter_frames(source, features), features, totals):
+                pass
+        means.update(zip(features, totals_means(totals)))
+
+    base = np.array([means[f] for f in features], dtype="float64")
+    return diagnostics_result(target, features, model, base, parse_scenarios(plan))
 
 def build_feature_impact_chart(result):
     target = result.get("target", "metric")
@@ -84,6 +144,25 @@ def build_feature_impact_chart(result):
         ]
     }
 
+def build_groupby_chart(result):
+    return {
+        "type": "bar",
+        "intent": "group_comparison",
+        "metric": result["metric"],
+        "description": {
+            "what": f"{result['agg']}_by_{result['group_by']}",
+            "based_on": "historical_data",
+            "unit": result["agg"]
+        },
+        "data": [
+            {
+                "label": str(g["label"]),
+                "value": g["value"]
+            }
+            for g in result["groups"]
+        ]
+    }
+
 def user_requested_chart(question):
     keywords = [
         "chart",
@@ -110,58 +189,103 @@ def execute_clean(df, p):
         "report": report
     }
 
-OPERATORS = {
-    "argmax": lambda df, p: {
-        "analysis": "argmax",
-        "entity": df.loc[df[p["metric"]].idxmax()][p["group_by"]],
-        "value": float(df[p["metric"]].max())
-    },
+def extreme(df, p, cache, analysis):
+    stats = column_stats(df, p["metric"], cache)
 
-    "argmin": lambda df, p: {
-        "analysis": "argmin",
-        "entity": df.loc[df[p["metric"]].idxmin()][p["group_by"]],
-        "value": float(df[p["metric"]].min())
-    },
+    if "argmax" not in stats:
+        metric = df[p["metric"]]
+        label = metric.idxmax() if analysis == "argmax" else metric.idxmin()
+        value = metric.max() if analysis == "argmax" else metric.min()
+        return {"analysis": analysis, "entity": df.loc[label][p["group_by"]], "value": float(value)}
+
+    position = stats[analysis]
+    if position is None:
+        raise ValueError(f"Column '{p['metric']}' has no values")
+
+    return {
+        "analysis": analysis,
+        "entity": df[p["group_by"]].iloc[position],
+        "value": stats["max"] if analysis == "argmax" else stats["min"]
+    }
+
+def aggregate(df, p, cache, analysis):
+    stats = column_stats(df, p["metric"], cache)
+
+    if analysis == "count":
+        value = stats["count"]
+    elif analysis in stats:
+        value = stats[analysis]
+    else:
+        value = float(getattr(df[p["metric"]], analysis)())
+
+    return {
+        "analysis": analysis,
+        "metric": p["metric"],
+        "value": value
+    }
 
-    "lookup": lambda df, p: {
+def lookup(df, p, cache):
+    positions = filter_positions(df, p["filter"], cache)
+    values = list(p["filter"].values())
+
+    if not len(positions):
+        raise ValueError(f"No rows match {p['filter']}")
+
+    return {
         "analysis": "lookup",
-        "entity": list(p["filter"].values())[0],
-        "value": float(
-            df[
-                df[list(p["filter"].keys())[0]] ==
-                list(p["filter"].values())[0]
-            ][p["metric"]].iloc[0]
-        )
-    },
+        "entity": values[0] if len(values) == 1 else ", ".join(str(v) for v in values),
+        "value": float(df[p["metric"]].iloc[positions[0]])
+    }
+
+OPERATORS = {
+    "argmax": lambda df, p, cache: extreme(df, p, cache, "argmax"),
+
+    "argmin": lambda df, p, cache: extreme(df, p, cache, "argmin"),
+
+    "lookup": lookup,
 
     "sales_diagnostics": sales_diagnostics,
 
-    "chat": lambda df, p: {
+    "chat": lambda df, p, cache: {
         "analysis": "chat",
         "reply": p["reply"]
     },
 
-    "sum": lambda df, p: {
-        "analysis": "sum",
-        "metric": p["metric"],
-        "value": float(df[p["metric"]].sum())
-    },
+    "sum": lambda df, p, cache: aggregate(df, p, cache, "sum"),
 
-    "mean": lambda df, p: {
-        "analysis": "mean",
-        "metric": p["metric"],
-        "value": float(df[p["metric"]].mean())
-    },
+    "mean": lambda df, p, cache: aggregate(df, p, cache, "mean"),
 
-    "count": lambda df, p: {
-        "analysis": "count",
-        "metric": p["metric"],
-        "value": int(df[p["metric"]].count())
-    },
+    "count": lambda df, p, cache: aggregate(df, p, cache, "count"),
+
+    "clean": lambda df, p, cache: execute_clean(df, p),
+
+    "groupby_sum": lambda df, p, cache: group_by_metric(df, p, cache, "sum"),
+
+    "groupby_mean": lambda df, p, cache: group_by_metric(df, p, cache, "mean"),
+
+    "groupby_count": lambda df, p, cache: group_by_metric(df, p, cache, "count"),
 
-    "clean": execute_clean
+    "top_k": lambda df, p, cache: group_by_metric(df, p, cache, p.get("agg", "sum"))
 }
 
+# Operators that only read the columns named in the plan
+COLUMN_OPERATORS = {
+    "argmax", "argmin", "lookup", "sum", "mean", "count", "chat",
+    "groupby_sum", "groupby_mean", "groupby_count", "top_k"
+}
+
+GROUPBY_OPERATORS = {"groupby_sum", "groupby_mean", "groupby_count", "top_k"}
+
+def plan_columns(plan, available):
+    """Columns a plan needs, or None when the operator needs the whole frame."""
+    if plan.get("operator") not in COLUMN_OPERATORS:
+        return None
+
+    cols = [plan[key] for key in ("metric", "group_by") if key in plan]
+    cols += list(plan.get("filter", {}).keys())
+
+    return [c for c in dict.fromkeys(cols) if c in available]
+
 def validate_plan(plan, df):
     if "operator" not in plan:
         raise ValueError("Plan missing operator")
@@ -175,22 +299,53 @@ def validate_plan(plan, df):
     if "group_by" in plan and plan["group_by"] not in df.columns:
         raise ValueError(f"Column '{plan['group_by']}' not found in dataset")
 
+    if plan["operator"] in GROUPBY_OPERATORS:
+        if "metric" not in plan or "group_by" not in plan:
+            raise ValueError("Grouped aggregation needs both a metric and a group_by column")
+        counting = plan["operator"] == "groupby_count" or plan.get("agg") == "count"
+        if not counting and not pd.api.types.is_numeric_dtype(df[plan["metric"]]):
+            raise ValueError(f"Column '{plan['metric']}' is not numeric")
+
+    if plan["operator"] == "sales_diagnostics":
+        parse_scenarios(plan)
+
     if "filter" in plan:
-        col = list(plan["filter"].keys())[0]
-        if col not in df.columns:
-            raise ValueError(f"Column '{col}' not found in dataset")
+        if not plan["filter"]:
+            raise ValueError("Filter is empty")
+        for col in plan["filter"]:
+            if col not in df.columns:
+                raise ValueError(f"Column '{col}' not found in dataset")
 
 
-def run_plan(plan, df):
+def data_issue_reply(error):
+    return {
+        "analysis": "chat",
+        "reply": f"I couldn't process that request because of a data issue: {str(error)}. Please try asking about columns that exist in your file."
+    }
+
+def run_plan(plan, df, cache=None):
+    """Execute plan against df. `cache` is the per-version dataset cache
+    (state.Dataset.cache); without it nothing is reused between calls."""
     try:
         validate_plan(plan, df)
     except ValueError as e:
-        return {
-            "analysis": "chat",
-            "reply": f"I couldn't process that request because of a data issue: {str(e)}. Please try asking about columns that exist in your file."
-        }
+        return data_issue_reply(e)
     
-    return OPERATORS[plan["operator"]](df, plan)
+    return OPERATORS[plan["operator"]](df, plan, cache if cache is not None else {})
+
+# Operators that can read the dataset file batch by batch instead of a resident frame
+STREAMING_OPERATORS = {
+    "sales_diagnostics": stream_sales_diagnostics
+}
+
+def run_plan_from_source(plan, source, cache=None):
+    """Execute a STREAMING_OPERATORS plan against the Arrow file at source."""
+    try:
+        validate_plan(plan, store_service.empty_frame(source))
+    except ValueError as e:
+        return data_issue_reply(e)
+
+    return STREAMING_OPERATORS[plan["operator"]](source, plan, cache if cache is not None else {})
 
 def explain_result(result):
     if result["analysis"] == "sales_diagnostics":
@@ -206,6 +361,12 @@ def explain_result(result):
                 f"**{a['delta_sales']} units** in sales."
             )
 
+        for scenario in result.get("scenarios", []):
+            bullets.append("")
+            bullets.append(f"If each driver changed by **{scenario['change']:+.0%}** on its own:")
+            for a in scenario["impacts"]:
+                bullets.append(f"- **{a['feature']}** would move sales by **{a['delta_sales']:+} units**.")
+
         closing = (
             "These insights are based on correlations found in your dataset."
         )
@@ -241,6 +402,9 @@ def explain_result(result):
     if result["analysis"] == "count":
         return f"I found a total count of **{result['value']}** for **{result['metric']}**."
 
+    if result["analysis"] == "groupby":
+        return explain_groupby(result)
+
     if result["analysis"] == "clean":
         if "report" in result:
              return explain_data_cleaning(result["report"])
@@ -248,6 +412,31 @@ def explain_result(result):
 
     return "I’m unable to generate a clear explanation for this result."
 
+AGG_LABELS = {"sum": "total", "mean": "average", "count": "count of"}
+
+def explain_groupby(result):
+    groups = result["groups"]
+    label = AGG_LABELS[result["agg"]]
+
+    if not groups:
+        return f"I couldn't find any **{result['group_by']}** groups with values for **{result['metric']}**."
+
+    best = groups[0]
+    fmt = ",.0f" if result["agg"] == "count" else ",.2f"
+    direction = "lowest" if result["order"] == "asc" else "highest"
+    lines = [
+        f"Grouped by **{result['group_by']}**, the {direction} {label} **{result['metric']}** "
+        f"is in **{best['label']}**, at **{best['value']:{fmt}}**."
+    ]
+
+    if len(groups) > 1:
+        lines.append("")
+        lines.append(f"Top {len(groups)} of {result['total_groups']} groups:")
+        for g in groups:
+            lines.append(f"- {g['label']}: {g['value']:{fmt}}")
+
+    return "\n".join(lines)
+
 def explain_data_cleaning(report):
     lines = []
 
@@ -281,7 +470,7 @@ def explain_data_cleaning(report):
         )
 
         lines.append(
-            "To correct this, I balanced the dataset using controlled undersampling."
+            f"To correct this, I balanced the dataset using controlled {imbalance.get('action', 'undersampling')}."
         )
 
         lines.append(
@@ -307,6 +496,10 @@ def explain_data_cleaning(report):
     return "\n\n".join(lines)
 
 def build_api_response(result, visualize_requested):
+    with span("explain"):
+        return api_response(result, visualize_requested)
+
+def api_response(result, visualize_requested):
     response = {
         "answer": explain_result(result)
     }
@@ -319,4 +512,9 @@ def build_api_response(result, visualize_requested):
             build_feature_impact_chart(result)
         ]
 
+    if result["analysis"] == "groupby" and visualize_requested:
+        response["charts"] = [
+            build_groupby_chart(result)
+        ]
+
     return response
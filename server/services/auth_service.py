@@ -0,0 +1,116 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+import config
+from services import metrics_service
+
+# Password hashing off the event loop. bcrypt is deliberately slow (hundreds
+# of ms of CPU per call), so hashes run on a small dedicated thread pool (the
+# bcrypt C code releases the GIL) with a cap on how many calls may wait for
+# it, and a per-email limiter stops one account's login burst from occupying
+# the pool.
+
+# min/max pinned to the configured cost, so hashes made with another cost
+# are flagged for a rehash on the next successful login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=config.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=config.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=config.BCRYPT_ROUNDS
+)
+
+hash_executor = ThreadPoolExecutor(max_workers=config.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+hash_slots = None  # asyncio.Semaphore, created on first use inside the event loop
+hash_waiting = 0
+
+class HashQueueFull(Exception):
+    """More password hashes are waiting than PASSWORD_HASH_QUEUE_SIZE allows."""
+
+async def run_hash(op, fn, *args):
+    global hash_slots, hash_waiting
+    if hash_slots is None:
+        hash_slots = asyncio.Semaphore(config.PASSWORD_HASH_WORKERS)
+
+    if hash_slots.locked() and hash_waiting >= config.PASSWORD_HASH_QUEUE_SIZE:
+        metrics_service.inc("vectora_password_hash_rejected_total", op=op)
+        raise HashQueueFull()
+
+    hash_waiting += 1
+    queued = time.perf_counter()
+    try:
+        await hash_slots.acquire()
+    finally:
+        hash_waiting -= 1
+
+    try:
+        started = time.perf_counter()
+        metrics_service.observe("vectora_password_hash_wait_seconds", started - queued, op=op)
+        result = await asyncio.get_running_loop().run_in_executor(hash_executor, fn, *args)
+        metrics_service.observe("vectora_password_hash_seconds", time.perf_counter() - started, op=op)
+        return result
+    finally:
+        hash_slots.release()
+
+async def hash_password(password):
+    return await run_hash("hash", pwd_context.hash, password)
+
+async def verify_password(password, hashed_password):
+    """(matches, new hash or None); a new hash is returned when the stored
+    one was made with different cost parameters and should be replaced."""
+    if not hashed_password:
+        return False, None
+    return await run_hash("verify", pwd_context.verify_and_update, password, hashed_password)
+
+def close_executor():
+    hash_executor.shutdown(wait=False, cancel_futures=True)
+
+class RateLimiter:
+    """At most `limit` attempts per key in any `window` seconds."""
+
+    def __init__(self, limit, window, max_keys=100_000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.attempts = {}  # key -> deque of attempt times
+        self.lock = threading.Lock()
+
+    def _prune(self, now):
+        for key in [k for k, times in self.attempts.items() if times[-1] <= now - self.window]:
+            del self.attempts[key]
+
+    def hit(self, key):
+        """Record an attempt; returns seconds to wait if key is over the limit, else 0."""
+        now = time.monotonic()
+        with self.lock:
+            times = self.attempts.get(key)
+            if times is None:
+                if len(self.attempts) >= self.max_keys:
+                    self._prune(now)
+                times = self.attempts[key] = deque()
+
+            while times and times[0] <= now - self.window:
+                times.popleft()
+            if len(times) >= self.limit:
+                return times[0] + self.window - now
+
+            times.append(now)
+            return 0
+
+    def reset(self, key):
+        with self.lock:
+            self.attempts.pop(key, None)
+
+login_limiter = RateLimiter(config.LOGIN_RATE_LIMIT, config.LOGIN_RATE_WINDOW_SECONDS)
+
+def limiter_key(action, email):
+    return f"{action}:{email.strip().lower()}"
+
+metrics_service.describe("vectora_password_hash_seconds", "histogram", "Time spent hashing or verifying one password.")
+metrics_service.describe("vectora_password_hash_wait_seconds", "histogram", "Time a password hash waited for a free worker.")
+metrics_service.describe("vectora_password_hash_rejected_total", "counter", "Password hashes refused because the queue was full.")
+metrics_service.describe("vectora_auth_rate_limited_total", "counter", "Register/login attempts refused by the per-email rate limiter.")
+metrics_service.gauge("vectora_password_hash_queue_depth", "Password hashes waiting for a worker.", lambda: hash_waiting)
@@ -0,0 +1,208 @@
+import os
+import time
+import asyncio
+import threading
+from bson import json_util
+from pymongo.errors import BulkWriteError
+import config
+from database import db
+from logger import log
+from services import metrics_service
+
+# Write-behind buffer for chat logs: /ask only queues the record, and a
+# background task writes batches with insert_many once CHAT_LOG_BATCH_SIZE
+# records are waiting or CHAT_LOG_FLUSH_SECONDS have passed. Batches that
+# cannot be written (Mongo down, queue full) are appended to a spill file and
+# replayed once Mongo accepts writes again.
+
+DUPLICATE_KEY = 11000
+
+def chats_collection():
+    database = db.get_db()
+    return database["chats"] if database is not None else None
+
+def only_duplicates(error):
+    """A replayed batch that was partly written before: every failure is a
+    duplicate _id, so everything is now in the collection."""
+    errors = error.details.get("writeErrors", [])
+    return bool(errors) and all(e.get("code") == DUPLICATE_KEY for e in errors)
+
+class ChatLogWriter:
+    def __init__(self, get_collection=chats_collection, spill_path=None):
+        self.get_collection = get_collection
+        self.spill_path = spill_path or config.CHAT_LOG_SPILL_PATH
+        self.spill_lock = threading.Lock()
+        self.queue = None
+        self.task = None
+        self.closing = False
+        self.last_replay = 0.0
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=config.CHAT_LOG_QUEUE_SIZE)
+        self.closing = False
+        self.task = asyncio.create_task(self.run())
+
+    async def enqueue(self, doc):
+        """Queue doc for writing. When the queue stays full for
+        CHAT_LOG_ENQUEUE_TIMEOUT_SECONDS the record is spilled to disk instead,
+        so a slow Mongo delays requests by at most that long."""
+        if not self.enabled():
+            metrics_service.inc("vectora_chat_log_writes_total", outcome="dropped")
+            return
+
+        if self.queue is None:
+            # Not started (e.g. scripts without the app's startup hooks)
+            await self.write([doc])
+            return
+
+        try:
+            await asyncio.wait_for(self.queue.put(doc), config.CHAT_LOG_ENQUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            metrics_service.inc("vectora_chat_log_writes_total", outcome="queue_full")
+            await asyncio.to_thread(self.spill, [doc])
+
+    def enabled(self):
+        # Without a configured database there is nothing to write or replay into
+        return bool(config.MONGO_URI) or self.get_collection() is not None
+
+    def depth(self):
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def next_batch(self):
+        """Up to CHAT_LOG_BATCH_SIZE queued records, waiting at most
+        CHAT_LOG_FLUSH_SECONDS after the first one; [] when idle."""
+        try:
+            batch = [await asyncio.wait_for(self.queue.get(), config.CHAT_LOG_FLUSH_SECONDS)]
+        except asyncio.TimeoutError:
+            return []
+
+        deadline = time.monotonic() + config.CHAT_LOG_FLUSH_SECONDS
+        while len(batch) < config.CHAT_LOG_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def replay_due(self):
+        return not self.closing and time.monotonic() - self.last_replay >= config.CHAT_LOG_REPLAY_SECONDS
+
+    async def run(self):
+        while not (self.closing and self.queue.empty()):
+            batch = await self.next_batch()
+            written = False
+            if batch:
+                try:
+                    written = await self.write(batch)
+                except asyncio.CancelledError:
+                    # Drain timed out mid-insert; keep the batch
+                    self.spill(batch)
+                    raise
+            if (written or not batch) and self.replay_due():
+                await self.replay()
+
+    async def insert(self, batch):
+        collection = self.get_collection()
+        if collection is None:
+            raise RuntimeError("database not connected")
+
+        start = time.perf_counter()
+        try:
+            await collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            if not only_duplicates(e):
+                raise
+        metrics_service.observe("vectora_chat_log_flush_seconds", time.perf_counter() - start)
+
+    async def write(self, batch):
+        """Insert batch, spilling it on failure; returns whether it was written."""
+        try:
+            await self.insert(batch)
+        except Exception as e:
+            log.warning("Chat log write of %d record(s) failed, spilling to disk: %s", len(batch), e)
+            metrics_service.inc("vectora_chat_log_writes_total", len(batch), outcome="spilled")
+            await asyncio.to_thread(self.spill, batch)
+            return False
+
+        metrics_service.inc("vectora_chat_log_writes_total", len(batch), outcome="ok")
+        return True
+
+    def spill(self, batch):
+        # Extended JSON keeps datetimes and ObjectIds (set by a partial
+        # insert_many) intact for the replay
+        lines = "".join(json_util.dumps(doc) + "\n" for doc in batch)
+        with self.spill_lock:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            with open(self.spill_path, "a") as fh:
+                fh.write(lines)
+
+    def take_spilled(self):
+        """Move the spill file aside and return its records."""
+        replay_path = f"{self.spill_path}.replay"
+        with self.spill_lock:
+            if os.path.exists(self.spill_path):
+                if os.path.exists(replay_path):
+                    # Left over from a replay interrupted by a crash
+                    with open(replay_path, "a") as out, open(self.spill_path) as fh:
+                        out.write(fh.read())
+                    os.remove(self.spill_path)
+                else:
+                    os.replace(self.spill_path, replay_path)
+            elif not os.path.exists(replay_path):
+                return []
+
+        with open(replay_path) as fh:
+            docs = [json_util.loads(line) for line in fh if line.strip()]
+        os.remove(replay_path)
+        return docs
+
+    async def replay(self):
+        """Write spilled records back to Mongo in batches."""
+        self.last_replay = time.monotonic()
+        if not os.path.exists(self.spill_path) and not os.path.exists(f"{self.spill_path}.replay"):
+            return 0
+
+        docs = await asyncio.to_thread(self.take_spilled)
+        for start in range(0, len(docs), config.CHAT_LOG_BATCH_SIZE):
+            batch = docs[start:start + config.CHAT_LOG_BATCH_SIZE]
+            try:
+                await self.insert(batch)
+            except asyncio.CancelledError:
+                self.spill(docs[start:])
+                raise
+            except Exception as e:
+                log.warning("Chat log replay failed, keeping %d record(s) spilled: %s", len(docs) - start, e)
+                await asyncio.to_thread(self.spill, docs[start:])
+                return start
+            metrics_service.inc("vectora_chat_log_writes_total", len(batch), outcome="replayed")
+
+        if docs:
+            log.info("Replayed %d spilled chat log(s)", len(docs))
+        return len(docs)
+
+    async def close(self):
+        """Stop taking records and flush what is queued; whatever is not
+        written within CHAT_LOG_DRAIN_TIMEOUT_SECONDS is spilled."""
+        if self.task is None:
+            return
+        self.closing = True
+        try:
+            await asyncio.wait_for(self.task, config.CHAT_LOG_DRAIN_TIMEOUT_SECONDS)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+        self.task = None
+
+        pending = []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        if pending:
+            self.spill(pending)
+        self.queue = None
+
+chat_logs = ChatLogWriter()
+
+metrics_service.describe("vectora_chat_log_flush_seconds", "histogram", "Time to insert one batch of chat logs.")
+metrics_service.gauge("vectora_chat_log_queue_depth", "Chat logs waiting to be written.", chat_logs.depth)
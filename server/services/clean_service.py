@@ -0,0 +1,71 @@
+import pyarrow as pa
+from fastapi.concurrency import run_in_threadpool
+import config
+from logger import log
+import state
+from services import store_service
+from services.data_service import run_cleaning, plan_cleaning
+from services.job_service import update_job, stage_reporter, result_path
+from services.executor_service import run_in_worker, plan_timeout
+
+# Advanced cleaning as a background job: the cleaned frame is written as an
+# Arrow file under the job's id in JOB_DIR and exported through
+# /download/advanced?job_id=...
+
+def clean_job(job_id, df, target, problem_type):
+    from services.analysis_service import explain_data_cleaning
+
+    stages = plan_cleaning(problem_type, target)
+    progress = stage_reporter(job_id, ["load", *stages, "write"])
+    try:
+        cleaned_df, report = run_cleaning(df, stages, target, progress)
+
+        progress("write")
+        write_result(cleaned_df, result_path(job_id, ".arrow"))
+
+        update_job(
+            job_id,
+            status="done",
+            stage=None,
+            progress=1.0,
+            result={
+                "summary": explain_data_cleaning(report),
+                "report": report,
+                "rows": len(cleaned_df),
+                "download": f"/download/advanced?job_id={job_id}"
+            }
+        )
+    except Exception as e:
+        log.error("Clean job %s failed: %s", job_id, e)
+        update_job(job_id, status="failed", error=f"Error cleaning data: {str(e)}")
+
+def clean_job_from_source(job_id, source, target, problem_type):
+    """clean_job for a worker process, reading the dataset's Arrow file."""
+    update_job(job_id, status="running", stage="load")
+    clean_job(job_id, store_service.load_dataset(source), target, problem_type)
+
+def write_result(df, path):
+    try:
+        store_service.write_dataset(df, None, path=path)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # Mixed-type object columns: keep their text form
+        text = {col: "str" for col in df.select_dtypes(include=["object"]).columns}
+        store_service.write_dataset(df.astype(text), None, path=path)
+
+async def run_clean_job(job_id, dataset, target, problem_type):
+    with state.acquire(dataset.id):
+        try:
+            if config.PLAN_WORKERS > 0 and dataset.source:
+                await run_in_worker(
+                    clean_job_from_source, job_id, dataset.source, target, problem_type,
+                    timeout=plan_timeout("clean")
+                )
+            else:
+                update_job(job_id, status="running", stage="load")
+                df = await run_in_threadpool(state.get_df, dataset.id)
+                await run_in_threadpool(clean_job, job_id, df, target, problem_type)
+        except Exception as e:
+            # clean_job reports its own failures; this catches the ones around
+            # it, which would otherwise leave the job "running" for good
+            log.error("Clean job %s failed: %s", job_id, e)
+            update_job(job_id, status="failed", error=f"Error cleaning data: {str(e) or type(e).__name__}")
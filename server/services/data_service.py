@@ -1,43 +1,79 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import config
+from services.intent_service import normalize_text, column_relevance
+from services.sketch_service import (
+    use_sketches, approx_mode, approx_distinct, approx_value_counts, approx_quantiles
+)
 
-def clean_columns(df):
-    df = df.copy()
-    df.columns = (
-        df.columns
+def clean_column_names(columns):
+    return (
+        columns
         .str.replace("\n", " ", regex=False)
         .str.replace("/", " ", regex=False)
         .str.replace("-", " ", regex=False)
         .str.strip()
     )
-    return df
 
-def clean_missing_values(df):
+def clean_columns(df):
     df = df.copy()
+    df.columns = clean_column_names(df.columns)
+    return df
 
-    for col in df.columns:
-        if pd.api.types.is_numeric_dtype(df[col]):
-            df[col] = df[col].fillna(df[col].mean())
-        else:
-            mode = df[col].mode()
-            if not mode.empty:
-                df[col] = df[col].fillna(mode[0])
+def missing_fill_values(df):
+    """Fill value for every column that has missing values: the mean for
+    numeric columns and the most frequent value otherwise."""
+    nulls = len(df) - df.count()
+    missing = nulls[nulls > 0].index
 
-    return df
+    numeric = [col for col in missing if pd.api.types.is_numeric_dtype(df[col])]
+    means = df[numeric].mean() if numeric else {}
+
+    fills = {col: means[col] for col in numeric if pd.notna(means[col])}
+    for col in missing:
+        if col not in fills and col not in numeric:
+            mode = column_mode(df[col])
+            if mode is not None:
+                fills[col] = mode
+    return fills
+
+def column_mode(series):
+    if use_sketches(series):
+        return approx_mode(series)
+    mode = series.mode()
+    return None if mode.empty else mode[0]
+
+def clean_missing_values(df):
+    # One fillna over all columns; untouched columns are shared, not copied
+    fills = missing_fill_values(df)
+    return df.fillna(fills) if fills else df
 
 def remove_duplicates(df):
-    return df.drop_duplicates()
+    # duplicated() already hashes factorized columns; the filter is skipped
+    # (and nothing copied) when there are no duplicates
+    mask = df.duplicated().to_numpy()
+    return df[~mask] if mask.any() else df
 
 def clean_dataframe(df):
-    df = clean_missing_values(df)
-    df = remove_duplicates(df)
+    df, _ = run_cleaning(df, ["missing_values", "duplicates"])
     return df
 
 def detect_class_imbalance(df, target_col, threshold=0.75):
     if target_col not in df.columns:
         return None
 
-    value_counts = df[target_col].value_counts(normalize=True)
+    target = df[target_col]
+    if use_sketches(target):
+        if round(approx_distinct(target)) != 2:
+            return None  # not binary
+        value_counts = approx_value_counts(target, 2, normalize=True)
+    else:
+        value_counts = target.value_counts(normalize=True)
 
     if len(value_counts) != 2:
         return None  # not binary
@@ -58,83 +94,251 @@ def detect_class_imbalance(df, target_col, threshold=0.75):
         "distribution": value_counts.to_dict()
     }
 
-def balance_binary_classes(df, target_col):
-    counts = df[target_col].value_counts()
+BALANCE_MODES = {"undersample": "undersampling", "oversample": "oversampling"}
 
-    if len(counts) != 2:
-        return df
+def class_picks(counts, mode, rng):
+    """For each class, the sorted within-class ranks of the rows to keep so
+    every class ends up with as many rows as the smallest (undersample) or
+    largest (oversample) class. Oversampled ranks appear more than once."""
+    if mode not in BALANCE_MODES:
+        raise ValueError(f"Unknown balancing mode '{mode}', use undersample or oversample")
 
-    minority_class = counts.idxmin()
-    minority_count = counts.min()
+    size = counts.min() if mode == "undersample" else counts.max()
+    picks = []
+    for n in counts:
+        if mode == "undersample":
+            ranks = rng.choice(n, size, replace=False)
+        else:
+            ranks = np.concatenate([np.arange(n), rng.integers(0, n, size - n)])
+        picks.append(np.sort(ranks))
+    return picks
 
-    df_min = df[df[target_col] == minority_class]
-    df_maj = df[df[target_col] != minority_class].sample(
-        n=minority_count,
-        random_state=42
-    )
+def select_rows(codes, picks):
+    """Positions of the picked rows among `codes` (class codes, -1 for
+    nulls), repeated for oversampled rows."""
+    selected = []
+    for c, pick in enumerate(picks):
+        rows = np.flatnonzero(codes == c)
+        copies = np.bincount(pick, minlength=len(rows))
+        selected.append(np.repeat(rows, copies))
+    return np.concatenate(selected) if selected else np.empty(0, dtype=np.intp)
+
+def rebalance_indices(labels, mode="undersample", random_state=42, counts=None):
+    """Shuffled row positions of a class-balanced sample of labels; rows
+    with a missing label are left out."""
+    if counts is None:
+        counts = labels.value_counts()
+    rng = np.random.default_rng(random_state)
+    if counts.empty:
+        return np.empty(0, dtype=np.intp)
+
+    picks = class_picks(counts.to_numpy(), mode, rng)
+    positions = select_rows(counts.index.get_indexer(labels), picks)
+    rng.shuffle(positions)
+    return positions
 
-    balanced_df = pd.concat([df_min, df_maj]).sample(frac=1, random_state=42)
-    return balanced_df
+def balance_classes(df, target_col, mode="undersample", random_state=42, counts=None):
+    # Only the positions are sampled and shuffled; rows are copied once
+    return df.take(rebalance_indices(df[target_col], mode, random_state, counts))
 
+def detect_multiclass_imbalance(df, target_col, threshold=0.75):
+    """detect_class_imbalance for targets with more than two classes: they
+    are imbalanced when the largest class outnumbers the smallest by as much
+    as a binary majority at `threshold` outnumbers its minority (3:1 at 0.75)."""
+    if target_col not in df.columns:
+        return None
+
+    counts = df[target_col].value_counts()
+    if len(counts) <= 2:
+        return None
+
+    distribution = (counts / counts.sum()).to_dict()
+    if counts.max() >= counts.min() * threshold / (1 - threshold):
+        return {"imbalanced": True, "counts": counts, "distribution": distribution}
+    return {"imbalanced": False, "distribution": distribution}
+
+def balance_binary_classes(df, target_col, mode="undersample"):
+    counts = df[target_col].value_counts()
+    if len(counts) != 2:
+        return df
+    return balance_classes(df, target_col, mode, counts=counts)
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+WHITESPACE = re.compile(r"\s+")
 
 def clean_text(text):
     if not isinstance(text, str):
         return ""
-    import re
     text = text.lower()
-    text = re.sub(r'[^\w\s]', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = PUNCTUATION.sub("", text)
+    text = WHITESPACE.sub(" ", text).strip()
     return text
 
+def text_array(series):
+    """Arrow string array of series with non-string values as nulls."""
+    if pd.api.types.is_string_dtype(series) and not pd.api.types.is_object_dtype(series):
+        return pa.array(series, type=pa.large_string(), from_pandas=True)
+    if pd.api.types.infer_dtype(series, skipna=True) != "string":
+        series = series.where(series.map(lambda v: isinstance(v, str)))
+    return pa.array(series, type=pa.large_string(), from_pandas=True)
+
+# clean_text for ASCII text, in RE2 syntax: Python's \w there is [0-9A-Za-z_]
+# and its \s also covers the \x1c-\x1f separators, which RE2's \s does not.
+# Outside ASCII, Arrow's and Python's Unicode tables (and lowercasing rules,
+# e.g. for a final sigma) differ, so other rows are left to clean_text.
+ASCII_PUNCTUATION = r"[^0-9A-Za-z_\t\n\x0b\x0c\r\x1c-\x1f ]"
+ASCII_WHITESPACE = r"[\t\n\x0b\x0c\r\x1c-\x1f ]+"
+
+def clean_text_array(values):
+    """clean_text over an Arrow string array: ASCII rows with Arrow kernels,
+    the others with clean_text itself."""
+    cleaned = pc.ascii_lower(values)
+    cleaned = pc.replace_substring_regex(cleaned, ASCII_PUNCTUATION, "")
+    cleaned = pc.replace_substring_regex(cleaned, ASCII_WHITESPACE, " ")
+    cleaned = pc.fill_null(pc.ascii_trim(cleaned, " "), "")
+
+    other = pc.invert(pc.fill_null(pc.string_is_ascii(values), True))
+    if pc.any(other).as_py():
+        rows = [clean_text(v) for v in pc.filter(values, other).to_pylist()]
+        cleaned = pc.replace_with_mask(cleaned, other, pa.array(rows, type=cleaned.type))
+    return cleaned
+
+def clean_text_series(series):
+    """clean_text over a whole column with Arrow kernels, splitting large
+    columns into chunks cleaned on parallel threads."""
+    values = text_array(series)
+
+    size = config.NLP_CHUNK_ROWS
+    if len(values) > size and config.NLP_WORKERS > 1:
+        chunks = [values.slice(start, size) for start in range(0, len(values), size)]
+        with ThreadPoolExecutor(config.NLP_WORKERS) as pool:
+            cleaned = pa.chunked_array(list(pool.map(clean_text_array, chunks)))
+    else:
+        cleaned = clean_text_array(values)
+
+    # set_axis, not Series(..., index=): the cleaned values are positional
+    return cleaned.to_pandas().set_axis(series.index).rename(series.name)
+
+def is_text_column(series):
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return False
+
+    # Average length from a sample rather than the whole column
+    sample = series
+    if len(series) > config.NLP_SAMPLE_ROWS:
+        sample = series.sample(n=config.NLP_SAMPLE_ROWS, random_state=0)
+    return sample.astype(str).str.len().mean() > 10
+
 def clean_for_nlp(df):
+    # Collected and assigned to a new frame: df may be the registry's own
+    cleaned = {}
     report_items = []
     for col in df.columns:
-        if df[col].dtype == 'object':
-            mean_len = df[col].astype(str).map(len).mean()
-            if mean_len > 10:
-                df[col] = df[col].apply(clean_text)
-                report_items.append(f"Cleaned text in column '{col}' (lowercased, removed punctuation).")
-    return df, report_items
-
-def advanced_clean_dataframe(df, target_col=None, problem_type="general"):
-    report = {}
-    
-    df = clean_missing_values(df)
+        if is_text_column(df[col]):
+            cleaned[col] = clean_text_series(df[col])
+            report_items.append(f"Cleaned text in column '{col}' (lowercased, removed punctuation).")
+    return (df.assign(**cleaned) if cleaned else df), report_items
+
+# Cleaning runs as a pipeline of named stages: plan_cleaning picks the stages
+# for a problem type and run_cleaning executes them, recording per-stage time
+# and the size of the frame it produced.
+
+def missing_values_stage(df, report, target_col):
     report["missing_values"] = "handled"
+    return clean_missing_values(df)
+
+def duplicates_stage(df, report, target_col):
+    cleaned = remove_duplicates(df)
+    report["duplicates_removed"] = len(df) - len(cleaned)
+    return cleaned
+
+def text_stage(df, report, target_col):
+    df, nlp_report = clean_for_nlp(df)
+    report["problem_type_actions"].extend(nlp_report)
+    return df
+
+def class_balance_stage(df, report, target_col):
+    imbalance = detect_class_imbalance(df, target_col)
+    multiclass = imbalance is None and detect_multiclass_imbalance(df, target_col)
+    if multiclass:
+        imbalance = multiclass
+
+    if imbalance and imbalance["imbalanced"]:
+        before_rows = len(df)
+        if multiclass:
+            df = balance_classes(df, target_col, config.CLASS_BALANCE_MODE, counts=imbalance["counts"])
+        else:
+            df = balance_binary_classes(df, target_col, config.CLASS_BALANCE_MODE)
+        report["class_imbalance"] = {
+            "action": BALANCE_MODES[config.CLASS_BALANCE_MODE],
+            "before_rows": before_rows,
+            "after_rows": len(df),
+            "distribution": imbalance["distribution"]
+        }
+    else:
+        report["class_imbalance"] = "not detected"
+    return df
 
-    before = len(df)
-    df = remove_duplicates(df)
-    report["duplicates_removed"] = before - len(df)
-    
-    report["problem_type_actions"] = []
+def class_distribution_stage(df, report, target_col):
+    report["class_distribution"] = df[target_col].value_counts(normalize=True).to_dict()
+    return df
+
+CLEANING_STAGES = {
+    "missing_values": missing_values_stage,
+    "duplicates": duplicates_stage,
+    "text": text_stage,
+    "class_balance": class_balance_stage,
+    "class_distribution": class_distribution_stage,
+}
+
+def plan_cleaning(problem_type="general", target_col=None):
+    stages = ["missing_values", "duplicates"]
 
     if problem_type == "sentiment_analysis":
-        df, nlp_report = clean_for_nlp(df)
-        report["problem_type_actions"].extend(nlp_report)
-        
-    elif problem_type == "binary_classification":
-        if target_col:
-            imbalance = detect_class_imbalance(df, target_col)
-            if imbalance and imbalance["imbalanced"]:
-                before_rows = len(df)
-                df = balance_binary_classes(df, target_col)
-                report["class_imbalance"] = {
-                    "action": "undersampling",
-                    "before_rows": before_rows,
-                    "after_rows": len(df),
-                    "distribution": imbalance["distribution"]
-                }
-            else:
-                 report["class_imbalance"] = "not detected"
-                 
-    elif problem_type == "classification":
-     
-         if target_col:
-             val_counts = df[target_col].value_counts(normalize=True).to_dict()
-             report["class_distribution"] = val_counts
+        stages.append("text")
+    elif problem_type == "binary_classification" and target_col:
+        stages.append("class_balance")
+    elif problem_type == "classification" and target_col:
+        stages.append("class_distribution")
+        if config.CLASS_BALANCE_MULTICLASS:
+            stages.append("class_balance")
+
+    return stages
+
+def run_cleaning(df, stages, target_col=None, progress=None):
+    """Run the named stages over df; returns (df, report) with the report's
+    "stages" entry holding each stage's seconds, rows and the size of the
+    frame it produced (its pandas/Arrow buffers, some shared with df).
+
+    df is left untouched, so it can be a dataset's live frame: stages return
+    a new frame (or df itself when they change nothing) and never assign
+    into the one they are given."""
+    report = {"problem_type_actions": []}
+    timings = []
+
+    for name in stages:
+        if progress:
+            progress(name)
+
+        started = time.perf_counter()
+
+        df = CLEANING_STAGES[name](df, report, target_col)
+
+        timings.append({
+            "stage": name,
+            "seconds": round(time.perf_counter() - started, 4),
+            "rows": len(df),
+            "frame_mb": round(df.memory_usage(index=True, deep=False).sum() / (1024 * 1024), 1),
+        })
 
+    report["stages"] = timings
     return df, report
 
+def advanced_clean_dataframe(df, target_col=None, problem_type="general", progress=None):
+    """Clean df for problem_type. `progress`, if given, is called with the
+    name of each stage as it starts."""
+    return run_cleaning(df, plan_cleaning(problem_type, target_col), target_col, progress)
+
 def resolve_sales_column(df):
     candidates = []
 
@@ -149,8 +353,112 @@ def resolve_sales_column(df):
 
     return candidates[0]
 
+def truncate_text(value, limit=None):
+    limit = limit or config.SCHEMA_MAX_TEXT_CHARS
+    text = str(value)
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+def profile_columns(df):
+    """Per-column dtype plus min/max for numerics and a few example values otherwise."""
+    numeric = df.select_dtypes(include=["number"])
+    mins, maxs = numeric.min(), numeric.max()
+    sample = df.head(config.SCHEMA_SAMPLE_ROWS)
+
+    profile = {}
+    for col in df.columns:
+        info = {"dtype": str(df[col].dtype)}
+        if col in numeric.columns:
+            if pd.notna(mins[col]):
+                info["min"] = float(mins[col])
+                info["max"] = float(maxs[col])
+                if use_sketches(df[col]):
+                    info["median"] = approx_quantiles(df[col], [0.5])[0]
+        elif use_sketches(df[col]):
+            # Most frequent values describe a large column better than its first rows
+            values = approx_value_counts(df[col], config.SCHEMA_MAX_VALUES).index
+            info["values"] = [truncate_text(v) for v in values]
+            info["distinct"] = int(round(approx_distinct(df[col])))
+        else:
+            values = sample[col].dropna().astype(str).unique()[:config.SCHEMA_MAX_VALUES]
+            info["values"] = [truncate_text(v) for v in values]
+        profile[col] = info
+
+    return profile
+
 def build_column_schema(df):
     return {
         "columns": list(df.columns),
-        "sample_rows": df.head(3).to_dict(orient="records")
+        "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+        "rows": len(df),
+        "sample_rows": df.head(3).to_dict(orient="records"),
+        "profile": profile_columns(df)
     }
+
+def describe_column(col, info):
+    if "min" in info:
+        line = f"- {col} ({info['dtype']}): {info['min']:g} to {info['max']:g}"
+        if "median" in info:
+            line += f", median ~{info['median']:g}"
+        return line
+    if info.get("values"):
+        examples = ", ".join(repr(v) for v in info["values"])
+        line = f"- {col} ({info['dtype']}): e.g. {examples}"
+        if "distinct" in info:
+            line += f" (~{info['distinct']:,} distinct)"
+        return line
+    return f"- {col} ({info['dtype']})"
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def summarize_schema(schema, question, token_budget=None):
+    """Compact column listing for the planning prompt.
+
+    Columns whose names appear in the question are described first. Every
+    other column is at least named when the budget allows, and described in
+    dataset order with whatever budget is left; beyond that they are counted.
+    """
+    token_budget = token_budget or config.SCHEMA_TOKEN_BUDGET
+    dtypes = schema.get("dtypes", {})
+    profile = schema.get("profile") or {}
+
+    q = normalize_text(question)
+    relevance = {col: column_relevance(q, normalize_text(col)) for col in schema["columns"]}
+    relevant = sorted(
+        (col for col in schema["columns"] if relevance[col] > 0),
+        key=lambda col: -relevance[col]
+    )
+    others = [col for col in schema["columns"] if relevance[col] == 0]
+
+    def name_cost(col):
+        return estimate_tokens(repr(col)) + 1
+
+    lines, names, used = [], [], 0
+    # Budget held back so that columns not yet described can still be named
+    reserved = sum(name_cost(col) for col in others)
+    other_set = set(others)
+
+    for col in relevant + others:
+        if col in other_set:
+            reserved -= name_cost(col)
+        line = describe_column(col, profile.get(col, {"dtype": dtypes.get(col, "unknown")}))
+        cost = estimate_tokens(line)
+        if used + cost + reserved <= token_budget:
+            lines.append(line)
+            used += cost
+        else:
+            names.append(col)
+            reserved += name_cost(col)
+
+    listed = []
+    for col in names:
+        if used + name_cost(col) > token_budget:
+            break
+        listed.append(repr(col))
+        used += name_cost(col)
+    if listed:
+        lines.append("Other columns: " + ", ".join(listed))
+    if len(listed) < len(names):
+        lines.append(f"... and {len(names) - len(listed)} more columns")
+
+    return "\n".join(lines)
@@ -0,0 +1,232 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import uuid
+from fastapi.concurrency import run_in_threadpool
+import config
+
+# Where plans run. Cheap operators stay in the threadpool; CPU-heavy ones go
+# to long-lived worker processes that read the dataset straight from its
+# memory-mapped Arrow file, so no frame is ever pickled across. A task owns
+# its worker exclusively, which lets a timeout or client disconnect stop it
+# by terminating that one process.
+
+PROCESS_OPERATORS = {"sales_diagnostics", "clean"}
+
+POLL_SECONDS = 0.25
+
+class PlanCancelled(Exception):
+    pass
+
+def plan_timeout(operator):
+    return config.PLAN_OPERATOR_TIMEOUTS.get(operator, config.PLAN_TIMEOUT_SECONDS)
+
+# -- worker side --------------------------------------------------------------
+
+# Derived data for the last dataset version this worker saw
+worker_cache = {}
+
+def execute_in_worker(plan, source, version, owner, parent=None, parent_models=None):
+    """Run plan against the Arrow file at source inside a worker process and
+    return (result, model fits of this version).
+
+    A cleaned frame is written next to the dataset and returned as
+    "new_source" instead of being sent back. `parent` and `parent_models`
+    are the dataset cache's parent entry and the server's fits of that
+    version, so models of a version that only appended rows are refitted
+    incrementally whichever worker fitted the parent.
+    """
+    from services import store_service, model_service
+    from services.analysis_service import run_plan, run_plan_from_source, STREAMING_OPERATORS
+    from services.data_service import build_column_schema
+
+    global worker_cache
+    if worker_cache.get("version") != version:
+        worker_cache = {"version": version}
+        if parent is not None:
+            worker_cache["parent"] = parent
+    if parent_models:
+        model_service.store_entries(parent_models)
+
+    if plan.get("operator") in STREAMING_OPERATORS:
+        result = run_plan_from_source(plan, source, worker_cache)
+    else:
+        df = store_service.load_dataset(source)
+        result = run_plan(plan, df, worker_cache)
+
+        new_df = result.pop("new_df", None)
+        if new_df is not None:
+            path = os.path.join(config.DATA_DIR, f"{uuid.uuid4().hex}.result")
+            store_service.write_dataset(
+                new_df, None, owner=owner, schema=build_column_schema(new_df), path=path
+            )
+            result["new_source"] = path
+
+    return result, model_service.version_entries(version)
+
+def worker_main(conn):
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        fn, args = task
+        try:
+            conn.send(("ok", fn(*args)))
+        except ValueError as e:
+            conn.send(("value_error", str(e)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+# -- server side --------------------------------------------------------------
+
+class Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        self.conn.close()
+
+# Spawned rather than forked: the server process holds threads and sockets
+context = multiprocessing.get_context("spawn")
+idle_workers = None
+workers = set()
+
+def _pool():
+    global idle_workers
+    if idle_workers is None:
+        idle_workers = asyncio.Queue()
+        for _ in range(config.PLAN_WORKERS):
+            _release(Worker(context))
+    return idle_workers
+
+def _release(worker):
+    workers.add(worker)
+    idle_workers.put_nowait(worker)
+
+def _replace(worker):
+    workers.discard(worker)
+    worker.kill()
+    _release(Worker(context))
+
+async def _take_worker(deadline, timeout, is_disconnected):
+    """An idle worker, waiting for one no longer than the plan may run and
+    only while the client is still there."""
+    waiter = asyncio.ensure_future(_pool().get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({waiter}, timeout=POLL_SECONDS)
+            if done:
+                return waiter.result()
+            if deadline is not None and time.monotonic() > deadline:
+                raise asyncio.TimeoutError(f"No plan worker became free within {timeout:g}s")
+            if is_disconnected is not None and await is_disconnected():
+                raise PlanCancelled("Client disconnected")
+    except BaseException:
+        if waiter.done() and not waiter.cancelled():
+            # Handed a worker just as we gave up: give it back untouched
+            idle_workers.put_nowait(waiter.result())
+        else:
+            waiter.cancel()
+        raise
+
+async def run_in_worker(fn, *args, timeout=None, is_disconnected=None):
+    """Run fn(*args) in a worker process.
+
+    Raises asyncio.TimeoutError after `timeout` seconds and PlanCancelled
+    once is_disconnected() returns True, counting time spent waiting for a
+    free worker; a worker that was already running fn is killed.
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    worker = await _take_worker(deadline, timeout, is_disconnected)
+
+    try:
+        worker.conn.send((fn, args))
+        while not await asyncio.to_thread(worker.conn.poll, POLL_SECONDS):
+            if deadline is not None and time.monotonic() > deadline:
+                raise asyncio.TimeoutError(f"Plan did not finish within {timeout:g}s")
+            if is_disconnected is not None and await is_disconnected():
+                raise PlanCancelled("Client disconnected")
+        status, payload = worker.conn.recv()
+    except (asyncio.TimeoutError, PlanCancelled, asyncio.CancelledError):
+        # Never reuse a worker that may still be busy
+        _replace(worker)
+        raise
+    except (EOFError, OSError) as e:
+        _replace(worker)
+        raise RuntimeError(f"Plan worker exited unexpectedly: {e}")
+    except Exception:
+        _replace(worker)
+        raise
+
+    _release(worker)
+
+    if status == "value_error":
+        raise ValueError(payload)
+    if status == "error":
+        raise RuntimeError(payload)
+    return payload
+
+def _pinned(dataset_id, fn, *args):
+    # The thread holds its own pin: a request that stops waiting releases
+    # its pin, but the thread keeps running against the frame until it returns
+    import state
+    with state.acquire(dataset_id):
+        return fn(*args)
+
+async def execute_plan(plan, dataset, cache, columns=None, is_disconnected=None):
+    """Run plan for a dataset inline or in a worker process, within the
+    operator's timeout. The caller pins the dataset (state.acquire)."""
+    import state
+    from services import model_service
+    from services.analysis_service import run_plan, run_plan_from_source, STREAMING_OPERATORS
+
+    operator = plan.get("operator")
+    timeout = plan_timeout(operator)
+    source = dataset.source
+
+    if config.PLAN_WORKERS > 0 and source and operator in PROCESS_OPERATORS:
+        parent = cache.get("parent")
+        parent_models = model_service.version_entries(parent[0]) if parent is not None else None
+        result, models = await run_in_worker(
+            execute_in_worker, plan, source, cache.get("version"), dataset.owner, parent, parent_models,
+            timeout=timeout, is_disconnected=is_disconnected
+        )
+        model_service.store_entries(models)
+        return result
+
+    if not dataset.resident and source and operator in STREAMING_OPERATORS:
+        # Stream from disk rather than mapping the whole dataset back in
+        call = run_in_threadpool(_pinned, dataset.id, run_plan_from_source, plan, source, cache)
+    else:
+        df = await run_in_threadpool(state.get_df, dataset.id, columns)
+        call = run_in_threadpool(_pinned, dataset.id, run_plan, plan, df, cache)
+
+    # Threads cannot be interrupted; the request stops waiting on timeout
+    # while the thread finishes under its own pin
+    return await asyncio.wait_for(call, timeout)
+
+def close_workers():
+    global idle_workers
+    for worker in list(workers):
+        worker.stop()
+    workers.clear()
+    idle_workers = None
@@ -0,0 +1,185 @@
+import os
+import uuid
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi.responses import FileResponse, StreamingResponse
+import config
+
+# Streams DataFrames to the client in row chunks as CSV, Parquet or Arrow IPC,
+# optionally compressed. Every stream is also written to a cache file; once
+# complete, repeat downloads of the same artifact are served from it.
+
+FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "arrow": ("application/vnd.apache.arrow.file", ".arrow"),
+}
+
+COMPRESSIONS = {
+    "gzip": ("application/gzip", ".gz"),
+    "zstd": ("application/zstd", ".zst"),
+}
+
+def negotiate(format=None, compression=None, accept=None):
+    """(format, compression) from query parameters, falling back to the
+    Accept header for the format. Raises ValueError for unsupported values."""
+    if format is None:
+        format = "csv"
+        for name, (media_type, _) in FORMATS.items():
+            if accept and media_type in accept:
+                format = name
+                break
+
+    format = format.lower()
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported format '{format}', use one of: {', '.join(FORMATS)}")
+
+    if compression in (None, "", "none"):
+        compression = None
+    elif compression.lower() not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression '{compression}', use gzip or zstd")
+    else:
+        compression = compression.lower()
+
+    if format == "arrow" and compression == "gzip":
+        raise ValueError("Arrow files only support zstd compression")
+
+    return format, compression
+
+def artifact_suffix(format, compression):
+    suffix = FORMATS[format][1]
+    # Parquet and Arrow compress internally; only CSV is wrapped in a compressed stream
+    if format == "csv" and compression:
+        suffix += COMPRESSIONS[compression][1]
+    return suffix
+
+def media_type(format, compression):
+    if format == "csv" and compression:
+        return COMPRESSIONS[compression][0]
+    return FORMATS[format][0]
+
+class ChunkSink:
+    """Write-only file object that buffers bytes until drained, copying them
+    to `tee` as they arrive."""
+
+    def __init__(self, tee):
+        self.parts = []
+        self.tee = tee
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.tee.write(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+def frame_chunks(df):
+    for start in range(0, len(df), config.EXPORT_CHUNK_ROWS):
+        yield df.iloc[start:start + config.EXPORT_CHUNK_ROWS]
+
+def encode_csv(df, sink, compression):
+    out = pa.PythonFile(sink, mode="w")
+    if compression:
+        out = pa.CompressedOutputStream(out, compression)
+
+    for i, chunk in enumerate(frame_chunks(df)):
+        out.write(chunk.to_csv(index=False, header=(i == 0)).encode())
+        yield
+    if len(df) == 0:
+        out.write(df.to_csv(index=False).encode())
+    out.close()
+
+def encode_table(df, sink, format, compression):
+    # Inferred from the whole frame, not its first chunk: a chunk that
+    # disagreed with it would fail after the response has started
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    out = pa.PythonFile(sink, mode="w")
+
+    if format == "parquet":
+        writer = pq.ParquetWriter(out, schema, compression=compression or "snappy")
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        writer = pa.ipc.new_file(out, schema, options=options)
+
+    for chunk in frame_chunks(df):
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield
+    writer.close()
+    out.close()
+
+def stream_frame(df, format, compression, cache_path):
+    """Yield df encoded chunk by chunk, keeping a copy at cache_path once the
+    whole stream has been produced."""
+    tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+    complete = False
+
+    try:
+        with open(tmp_path, "wb") as tee:
+            sink = ChunkSink(tee)
+            if format == "csv":
+                steps = encode_csv(df, sink, compression)
+            else:
+                steps = encode_table(df, sink, format, compression)
+
+            for _ in steps:
+                data = sink.drain()
+                if data:
+                    yield data
+            data = sink.drain()
+            if data:
+                yield data
+
+        os.replace(tmp_path, cache_path)
+        complete = True
+    finally:
+        # Client went away or encoding failed: drop the partial copy
+        if not complete and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def export_response(load_frame, cache_path, filename, format, compression):
+    """Response for an export: the cached artifact if it exists, otherwise a
+    stream of load_frame() that fills the cache as it goes."""
+    suffix = artifact_suffix(format, compression)
+    filename = f"{filename}{suffix}"
+    media = media_type(format, compression)
+
+    if os.path.exists(cache_path):
+        return FileResponse(cache_path, filename=filename, media_type=media)
+
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    return StreamingResponse(
+        stream_frame(load_frame(), format, compression, cache_path),
+        media_type=media,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def dataset_artifact(dataset, kind, format, compression):
+    """Cache path for an export of the dataset's current version; artifacts of
+    older versions are removed as newer ones are requested."""
+    version = dataset.cache.get("version", (dataset.id, dataset.version))[1]
+    prefix = f"{dataset.id}.v{version}."
+    os.makedirs(config.EXPORT_DIR, exist_ok=True)
+
+    for name in os.listdir(config.EXPORT_DIR):
+        if name.startswith(f"{dataset.id}.v") and not name.startswith(prefix) and not name.endswith(".tmp"):
+            os.remove(os.path.join(config.EXPORT_DIR, name))
+
+    return os.path.join(config.EXPORT_DIR, f"{prefix}{kind}{artifact_suffix(format, compression)}")
+
+def clear_artifacts():
+    """Versions restart with the process, so cached artifacts cannot be reused across runs."""
+    if not os.path.isdir(config.EXPORT_DIR):
+        return
+    for name in os.listdir(config.EXPORT_DIR):
+        os.remove(os.path.join(config.EXPORT_DIR, name))
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import config
+from services.index_service import column_codes
+
+# Sort-free group-by: factorized group codes (shared with the lookup index)
+# plus bincount. Per-group sums and counts are cached per
+# (group column, metric) in the per-version dataset cache.
+
+AGGREGATIONS = ("sum", "mean", "count")
+
+def group_totals(df, group_by, metric, cache):
+    totals = cache.setdefault("groupby", {})
+    key = (group_by, metric)
+
+    if key not in totals:
+        factorized = column_codes(df, group_by, cache)
+        codes = factorized["row_codes"]
+        groups = len(factorized["uniques"])
+
+        if pd.api.types.is_numeric_dtype(df[metric]):
+            values = df[metric].to_numpy(dtype="float64", na_value=np.nan)
+            present = (codes >= 0) & ~np.isnan(values)
+            sums = np.bincount(codes[present], weights=values[present], minlength=groups)
+        else:
+            # Text metrics can only be counted
+            present = (codes >= 0) & df[metric].notna().to_numpy()
+            sums = np.full(groups, np.nan)
+
+        totals[key] = {
+            "labels": factorized["uniques"],
+            "sums": sums,
+            "counts": np.bincount(codes[present], minlength=groups)
+        }
+
+    return totals[key]
+
+def aggregate_groups(df, group_by, metric, agg, cache):
+    totals = group_totals(df, group_by, metric, cache)
+
+    if agg == "sum":
+        return totals["labels"], totals["sums"]
+    if agg == "count":
+        return totals["labels"], totals["counts"].astype("float64")
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return totals["labels"], totals["sums"] / totals["counts"]
+
+def top_groups(values, k, ascending=False):
+    """Positions of the k largest (or smallest) values, best first, without a full sort."""
+    candidates = np.flatnonzero(~np.isnan(values))
+    if not len(candidates):
+        return candidates
+
+    keyed = values[candidates] if ascending else -values[candidates]
+    k = min(k, len(candidates))
+    if k < len(candidates):
+        part = np.argpartition(keyed, k - 1)[:k]
+        candidates, keyed = candidates[part], keyed[part]
+
+    return candidates[np.argsort(keyed, kind="stable")]
+
+def group_by_metric(df, p, cache, agg):
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"Unsupported aggregation: {agg}")
+
+    k = int(p.get("k", config.GROUPBY_DEFAULT_K))
+    if k < 1:
+        raise ValueError("k must be at least 1")
+
+    ascending = p.get("order") == "asc"
+    labels, values = aggregate_groups(df, p["group_by"], p["metric"], agg, cache)
+    top = top_groups(values, k, ascending)
+
+    return {
+        "analysis": "groupby",
+        "agg": agg,
+        "metric": p["metric"],
+        "group_by": p["group_by"],
+        "order": "asc" if ascending else "desc",
+        "total_groups": len(labels),
+        "groups": [
+            {"label": labels[i], "value": float(values[i])}
+            for i in top
+        ]
+    }
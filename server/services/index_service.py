@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+# Hash indexes (value -> row positions) built lazily per filter column and
+# kept in the per-version dataset cache, so they are dropped with it on
+# every state.set_df.
+
+def column_codes(df, column, cache):
+    """Factorized codes for a column (-1 for missing) and its distinct values."""
+    factorized = cache.setdefault("codes", {})
+    if column not in factorized:
+        codes, uniques = pd.factorize(df[column])
+        factorized[column] = {"row_codes": codes, "uniques": uniques.tolist()}
+    return factorized[column]
+
+def build_index(factorized):
+    codes = factorized["row_codes"]
+    uniques = factorized["uniques"]
+
+    # Rows grouped by code; missing values (code -1) sort first and are skipped
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    starts = np.concatenate(([0], np.cumsum(counts))) + int((codes < 0).sum())
+
+    return {
+        "codes": {value: code for code, value in enumerate(uniques)},
+        "order": order,
+        "starts": starts
+    }
+
+def column_index(df, column, cache):
+    indexes = cache.setdefault("indexes", {})
+    if column not in indexes:
+        indexes[column] = build_index(column_codes(df, column, cache))
+    return indexes[column]
+
+def positions_for(index, value):
+    try:
+        code = index["codes"].get(value)
+    except TypeError:
+        # Unhashable filter values cannot match anything
+        return np.empty(0, dtype=np.intp)
+
+    if code is None:
+        return np.empty(0, dtype=np.intp)
+
+    return index["order"][index["starts"][code]:index["starts"][code + 1]]
+
+def filter_positions(df, filters, cache):
+    """Sorted row positions matching every column == value pair in filters."""
+    matches = [
+        positions_for(column_index(df, column, cache), value)
+        for column, value in filters.items()
+    ]
+    matches.sort(key=len)
+
+    positions = matches[0]
+    for other in matches[1:]:
+        if not len(positions):
+            break
+        positions = np.intersect1d(positions, other, assume_unique=True)
+
+    return positions
@@ -0,0 +1,176 @@
+import os
+import shutil
+import uuid
+import numpy as np
+import pandas as pd
+import config
+from logger import log
+import state
+from services import store_service
+from services.data_service import clean_column_names
+from services.job_service import update_job
+
+DROP_COLUMNS = ("Unnamed: 0", "Unnamed: 17")
+
+def spool_upload(upload_file, filename):
+    """Copy an uploaded file to UPLOAD_DIR in fixed-size chunks and return its path."""
+    os.makedirs(config.UPLOAD_DIR, exist_ok=True)
+    ext = os.path.splitext(filename or "")[1]
+    path = os.path.join(config.UPLOAD_DIR, f"{uuid.uuid4().hex}{ext}")
+
+    upload_file.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(upload_file, out, config.UPLOAD_CHUNK_SIZE)
+
+    return path
+
+def _keep_column(name):
+    return name not in DROP_COLUMNS
+
+class ColumnTypesChanged(ValueError):
+    """Later chunks of a CSV hold values that do not fit the dtypes its
+    first chunk was written with; `widened` maps each such column to the
+    dtype the file has to be read with instead."""
+
+    def __init__(self, widened):
+        super().__init__(f"column types changed: {', '.join(widened)}")
+        self.widened = widened
+
+def _text_dtypes(first_chunk):
+    # Pin text columns so a later chunk of only digits still reads as text;
+    # numeric columns are inferred per chunk and conformed afterwards
+    return {
+        col: dtype for col, dtype in first_chunk.dtypes.items()
+        if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)
+    }
+
+def _is_number(dtype):
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+def _conform(chunk, expected):
+    """chunk with its columns cast to the expected dtypes wherever that
+    changes no value, and {column: wider dtype} for the columns it can't."""
+    cast, widened = {}, {}
+    for col, dtype in expected.items():
+        series = chunk[col]
+        if series.dtype == dtype:
+            continue
+        if _is_number(series.dtype) and _is_number(dtype):
+            if pd.api.types.is_float_dtype(dtype) or series.mod(1).eq(0).all():
+                cast[col] = series.astype(dtype)
+            else:
+                widened[col] = np.dtype("float64")
+        else:
+            widened[col] = "str"
+    return (chunk.assign(**cast) if cast else chunk), widened
+
+def _csv_frames(path, job_id, dtypes):
+    """The CSV as cleaned chunks, complete rows only, reporting progress.
+
+    Every chunk is conformed to the dtypes of the first (overridden by
+    `dtypes`). If some column can't be, nothing more is yielded, but the rest
+    of the file is still scanned so that ColumnTypesChanged names every
+    column that needs a wider type, not just the first one found.
+    """
+    size = os.path.getsize(path) or 1
+    columns = expected = None
+    widened = {}
+
+    with open(path, "rb") as fh:
+        reader = pd.read_csv(
+            fh,
+            usecols=_keep_column,
+            dtype={col: dtype for col, dtype in dtypes.items() if not _is_number(dtype)},
+            chunksize=config.CSV_CHUNK_ROWS
+        )
+        for chunk in reader:
+            # Drop incomplete rows per chunk so discarded rows never pile up
+            chunk = chunk.dropna()
+            if expected is None:
+                columns = clean_column_names(chunk.columns)
+                expected = chunk.dtypes.to_dict()
+                expected.update((col, dtype) for col, dtype in dtypes.items() if _is_number(dtype))
+
+            chunk, failed = _conform(chunk, expected)
+            expected.update(failed)
+            widened.update(failed)
+            if not widened:
+                chunk.columns = columns
+                yield chunk
+            update_job(job_id, progress=round(min(fh.tell() / size, 1.0) * 0.9, 3))
+
+    if widened:
+        raise ColumnTypesChanged(widened)
+
+    if columns is None:
+        header = pd.read_csv(path, usecols=_keep_column, nrows=0)
+        header.columns = clean_column_names(header.columns)
+        yield header
+
+def parse_csv(path, job_id, sink_path, owner=None):
+    """Stream the CSV into an Arrow file at sink_path one chunk at a time."""
+    first = pd.read_csv(path, usecols=_keep_column, nrows=config.CSV_CHUNK_ROWS)
+    dtypes = _text_dtypes(first)
+    del first
+
+    # Every chunk has to fit the first chunk's schema. When a later chunk
+    # disagrees, only the columns that don't fit are widened (integers to
+    # float, anything else to text) and the file is read again.
+    while True:
+        try:
+            return store_service.write_frames(_csv_frames(path, job_id, dtypes), sink_path, owner)
+        except ColumnTypesChanged as e:
+            if all(col in dtypes and dtypes[col] == dtype for col, dtype in e.widened.items()):
+                raise
+            log.info("Re-reading %s with wider column types: %s", path, e)
+            dtypes = {**dtypes, **e.widened}
+
+def parse_excel(path):
+    frame = pd.read_excel(path)
+    frame = frame.drop(list(DROP_COLUMNS), axis=1, errors='ignore')
+    return frame.dropna()
+
+def ingest_file(job_id, path, filename, dataset_id, owner=None, append=False):
+    """Parse a spooled upload and swap it into state. Runs in a worker thread."""
+    update_job(job_id, status="running")
+    staged = None
+
+    try:
+        if filename.endswith(('.xls', '.xlsx')):
+            frame = parse_excel(path)
+            frame.columns = clean_column_names(frame.columns)
+        else:
+            # CSVs go straight to an Arrow file next to the dataset's own,
+            # which the frame is then mapped from
+            existing = state.datasets.get(dataset_id)
+            staged = f"{store_service.dataset_path(dataset_id)}.{job_id}.ingest"
+            parse_csv(path, job_id, staged, existing.owner if existing is not None else owner)
+            frame = store_service.load_dataset(staged)
+
+        if append:
+            dataset = state.append_df(frame, dataset_id, owner=owner)
+            frame = dataset.df
+        else:
+            state.set_df(frame, dataset_id, owner=owner, source=staged)
+            staged = None
+
+        update_job(
+            job_id,
+            status="done",
+            progress=1.0,
+            result={
+                "dataset_id": dataset_id,
+                "columns": list(frame.columns),
+                "rows": len(frame)
+            }
+        )
+    except Exception as e:
+        log.error("Upload job %s failed: %s", job_id, e)
+        update_job(job_id, status="failed", error=f"Error processing file: {str(e)}")
+    finally:
+        for leftover in (path, staged):
+            try:
+                if leftover is not None:
+                    os.remove(leftover)
+            except OSError:
+                pass
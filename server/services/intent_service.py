@@ -0,0 +1,136 @@
+import re
+from difflib import SequenceMatcher
+import config
+
+# Rule-based planner for simple aggregate questions. It emits the same plan
+# JSON as llm_build_plan and declines (returns None) whenever it is unsure.
+
+Q = r"^(?:(?:what is|what are|whats|what s|tell me|show me|give me|get) )?(?:the )?"
+
+PATTERNS = [
+    ("sum", re.compile(Q + r"(?:sum|total) (?:of |for )?(?:the |all )?(?P<metric>.+)$")),
+    ("sum", re.compile(Q + r"(?P<metric>.+) (?:total|sum)$")),
+    ("mean", re.compile(Q + r"(?:average|avg|mean) (?:of |for )?(?:the |all )?(?P<metric>.+)$")),
+    ("count", re.compile(Q + r"count (?:of |the |all )*(?P<metric>.+)$")),
+    ("argmax", re.compile(
+        r"^(?:which|what) (?P<group>.+?) (?:has|had|have|with) (?:the )?"
+        r"(?:highest|most|max|maximum|largest|biggest|greatest|top) (?P<metric>.+)$"
+    )),
+    ("argmin", re.compile(
+        r"^(?:which|what) (?P<group>.+?) (?:has|had|have|with) (?:the )?"
+        r"(?:lowest|least|min|minimum|smallest|fewest|bottom) (?P<metric>.+)$"
+    )),
+    ("lookup", re.compile(
+        Q + r"(?P<metric>.+?) (?:of|for) (?:product )?(?P<value>p\d+)$"
+    )),
+]
+
+# Phrasings that need grouping, advice or charts are left to the LLM
+DECLINE_WORDS = {
+    "by", "per", "each", "every", "where", "and", "or", "not", "between",
+    "chart", "plot", "graph", "visualize", "visualise", "increase", "improve",
+    "clean", "why", "how"
+}
+
+NUMERIC_KINDS = ("int", "float", "uint")
+
+def normalize_text(text):
+    return re.sub(r"[^a-z0-9]+", " ", str(text).lower()).strip()
+
+def column_score(phrase, column):
+    if phrase == column:
+        return 1.0
+
+    score = SequenceMatcher(None, phrase, column).ratio()
+
+    phrase_tokens, column_tokens = set(phrase.split()), set(column.split())
+    if phrase_tokens and phrase_tokens <= column_tokens:
+        score = max(score, 0.75 + 0.25 * len(phrase_tokens) / len(column_tokens))
+
+    return score
+
+def column_relevance(question, column):
+    """How strongly a normalised question mentions a normalised column name."""
+    column_tokens = set(column.split())
+    if not column_tokens:
+        return 0.0
+    return len(column_tokens & set(question.split())) / len(column_tokens)
+
+def match_column(phrase, columns, prefer=None):
+    """Best fuzzy match for phrase among columns as (column, confidence)."""
+    phrase = normalize_text(phrase)
+    if not phrase:
+        return None, 0.0
+
+    scored = sorted(
+        ((column_score(phrase, normalize_text(col)), col) for col in columns),
+        key=lambda item: item[0],
+        reverse=True
+    )
+    if not scored:
+        return None, 0.0
+
+    best_score, best = scored[0]
+    rivals = [col for score, col in scored[1:] if score >= best_score - 0.05]
+    if rivals:
+        preferred = [
+            col for col in [best, *rivals]
+            if prefer and prefer in normalize_text(col).split()
+        ]
+        if len(preferred) != 1:
+            return None, 0.0
+        best = preferred[0]
+
+    return best, best_score
+
+def is_numeric(schema, column):
+    dtype = str(schema.get("dtypes", {}).get(column, ""))
+    return dtype.lower().startswith(NUMERIC_KINDS)
+
+def id_column(columns):
+    for col in columns:
+        if "id" in normalize_text(col).split():
+            return col
+    return None
+
+def fast_plan(question, schema):
+    """Plan for question without calling the LLM, or None when not confident."""
+    text = normalize_text(question)
+    if not text or DECLINE_WORDS & set(text.split()):
+        return None
+
+    columns = schema["columns"]
+
+    for operator, pattern in PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+
+        metric, confidence = match_column(match.group("metric"), columns)
+        if metric is None:
+            continue
+
+        plan = {"operator": operator, "metric": metric}
+
+        if operator in ("sum", "mean", "argmax", "argmin", "lookup") and not is_numeric(schema, metric):
+            return None
+
+        if operator in ("argmax", "argmin"):
+            group_by, group_confidence = match_column(match.group("group"), columns, prefer="name")
+            if group_by is None or group_by == metric:
+                return None
+            plan["group_by"] = group_by
+            confidence = min(confidence, group_confidence)
+
+        if operator == "lookup":
+            key = id_column(columns)
+            if key is None:
+                return None
+            plan["filter"] = {key: match.group("value").upper()}
+
+        if confidence < config.FAST_PATH_MIN_CONFIDENCE:
+            return None
+
+        return plan
+
+    return None
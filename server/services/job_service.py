@@ -0,0 +1,113 @@
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+import config
+
+# Registry of background jobs (uploads, cleans, ...). Each job is a JSON file
+# under JOB_DIR so it survives restarts and can be updated from worker
+# processes; result files live next to it and share its id.
+
+ACTIVE_STATUSES = ("queued", "running")
+
+def job_path(job_id):
+    return os.path.join(config.JOB_DIR, f"{job_id}.json")
+
+def result_path(job_id, ext):
+    return os.path.join(config.JOB_DIR, f"{job_id}.result{ext}")
+
+def _json_default(value):
+    # numpy scalars in reports
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+def _save(job):
+    os.makedirs(config.JOB_DIR, exist_ok=True)
+    path = job_path(job["id"])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump(job, fh, default=_json_default)
+    os.replace(tmp_path, path)
+
+def create_job(kind, **meta):
+    job_id = uuid.uuid4().hex
+    job = {
+        "id": job_id,
+        "kind": kind,
+        "status": "queued",
+        "stage": None,
+        "progress": 0.0,
+        "result": None,
+        "error": None,
+        "created_at": datetime.utcnow().isoformat(),
+        "updated_at": time.time(),
+        **meta
+    }
+    _save(job)
+    return job
+
+def get_job(job_id):
+    if not job_id or not job_id.isalnum():
+        return None
+    try:
+        with open(job_path(job_id)) as fh:
+            return json.load(fh)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def update_job(job_id, **fields):
+    # Only one process works on a job at a time, so read-modify-write is safe
+    job = get_job(job_id)
+    if job is not None:
+        job.update(fields, updated_at=time.time())
+        _save(job)
+    return job
+
+def stage_reporter(job_id, stages):
+    """progress(stage) callback that maps named stages onto the 0..1 range."""
+    def progress(stage):
+        position = stages.index(stage) if stage in stages else 0
+        update_job(job_id, stage=stage, progress=round(position / len(stages), 3))
+    return progress
+
+def remove_job(job_id):
+    for name in os.listdir(config.JOB_DIR):
+        if name.startswith(f"{job_id}."):
+            try:
+                os.remove(os.path.join(config.JOB_DIR, name))
+            except FileNotFoundError:
+                pass
+
+def recover_jobs():
+    """Fail jobs that were still running when the previous process stopped."""
+    if not os.path.isdir(config.JOB_DIR):
+        return 0
+
+    interrupted = 0
+    for name in os.listdir(config.JOB_DIR):
+        if not name.endswith(".json"):
+            continue
+        job = get_job(name[:-len(".json")])
+        if job is not None and job["status"] in ACTIVE_STATUSES:
+            update_job(job["id"], status="failed", error="Interrupted by a server restart")
+            interrupted += 1
+    return interrupted
+
+def cleanup_jobs(now=None):
+    """Delete finished jobs, and their result files, older than JOB_TTL_SECONDS."""
+    if not os.path.isdir(config.JOB_DIR):
+        return 0
+
+    cutoff = (now or time.time()) - config.JOB_TTL_SECONDS
+    removed = 0
+    for name in os.listdir(config.JOB_DIR):
+        if not name.endswith(".json"):
+            continue
+        job = get_job(name[:-len(".json")])
+        if job is None or job["status"] in ACTIVE_STATUSES or job["updated_at"] > cutoff:
+            continue
+        remove_job(job["id"])
+        removed += 1
+    return removed
@@ -1,9 +1,59 @@
 import re
 import json
-from openai import OpenAI
+import copy
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError
+import config
 from config import OPENAI_API_KEY
+from database import db
+from logger import log
+from services import metrics_service
+from services.metrics_service import span
+from services.intent_service import fast_plan
+from services.data_service import summarize_schema
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# One pooled HTTP client shared by every LLM call; retries are handled in
+# create_chat_completion so the SDK's own retry loop is disabled.
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=config.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=config.LLM_MAX_CONNECTIONS
+    ),
+    timeout=httpx.Timeout(config.LLM_TIMEOUT_SECONDS, connect=config.LLM_CONNECT_TIMEOUT_SECONDS)
+)
+
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    base_url=config.OPENAI_BASE_URL,
+    http_client=http_client,
+    max_retries=0
+)
+
+llm_semaphore = asyncio.Semaphore(config.LLM_CONCURRENCY)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Plans keyed on (normalised question, schema fingerprint) -> (plan, expires_at)
+plan_cache = OrderedDict()
+plan_cache_lock = threading.Lock()
+plan_cache_stats = {"hits": 0, "misses": 0, "persistent_hits": 0}
+
+def plan_cache_hit_ratio():
+    lookups = plan_cache_stats["hits"] + plan_cache_stats["misses"]
+    return plan_cache_stats["hits"] / lookups if lookups else None
+
+metrics_service.gauge(
+    "vectora_plan_cache_hit_ratio",
+    "Share of plan cache lookups (memory or Mongo) that found a plan.",
+    plan_cache_hit_ratio
+)
 
 def safe_json_parse(text):
     try:
@@ -18,15 +68,169 @@ def safe_json_parse(text):
 
     raise ValueError("LLM did not return valid JSON")
 
-def llm_build_plan(question, schema):
+def retry_delay(attempt, error):
+    # Honour Retry-After on 429s, otherwise exponential backoff with full jitter
+    if isinstance(error, APIStatusError):
+        retry_after = error.response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), config.LLM_BACKOFF_MAX_SECONDS)
+            except ValueError:
+                pass
+
+    ceiling = min(config.LLM_BACKOFF_MAX_SECONDS, config.LLM_BACKOFF_BASE_SECONDS * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+def is_retryable(error):
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    return isinstance(error, APIConnectionError)
+
+async def create_chat_completion(**kwargs):
+    """chat.completions.create behind the concurrency limiter, with retries."""
+    with span("llm"):
+        for attempt in range(config.LLM_MAX_RETRIES + 1):
+            try:
+                async with llm_semaphore:
+                    response = await client.chat.completions.create(
+                        timeout=config.LLM_TIMEOUT_SECONDS, **kwargs
+                    )
+            except Exception as e:
+                if not is_retryable(e) or attempt == config.LLM_MAX_RETRIES:
+                    metrics_service.inc("vectora_llm_requests_total", outcome="error")
+                    raise
+                metrics_service.inc("vectora_llm_requests_total", outcome="retry")
+                delay = retry_delay(attempt, e)
+                log.warning("LLM call failed (%s), retrying in %.2fs", e.__class__.__name__, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            metrics_service.inc("vectora_llm_requests_total", outcome="ok")
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                metrics_service.inc("vectora_llm_tokens_total", usage.prompt_tokens or 0, kind="prompt")
+                metrics_service.inc("vectora_llm_tokens_total", usage.completion_tokens or 0, kind="completion")
+            return response
+
+async def close_client():
+    await client.close()
+
+def normalize_question(question):
+    question = re.sub(r"\s+", " ", question.lower()).strip()
+    return question.strip(" ?!.")
+
+def schema_fingerprint(schema):
+    dtypes = schema.get("dtypes", {})
+    columns = [[col, dtypes.get(col)] for col in schema["columns"]]
+    return hashlib.sha1(json.dumps(columns, default=str).encode()).hexdigest()
+
+def plan_cache_key(question, schema):
+    raw = f"{normalize_question(question)}|{schema_fingerprint(schema)}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def get_cached_plan(key):
+    with plan_cache_lock:
+        entry = plan_cache.get(key)
+        if entry is None:
+            return None
+
+        plan, expires_at = entry
+        if expires_at < time.monotonic():
+            del plan_cache[key]
+            return None
+
+        plan_cache.move_to_end(key)
+        return copy.deepcopy(plan)
+
+def cache_plan(key, plan):
+    with plan_cache_lock:
+        plan_cache[key] = (copy.deepcopy(plan), time.monotonic() + config.PLAN_CACHE_TTL_SECONDS)
+        plan_cache.move_to_end(key)
+        while len(plan_cache) > config.PLAN_CACHE_SIZE:
+            plan_cache.popitem(last=False)
+
+def plan_cache_collection():
+    if not config.PLAN_CACHE_MONGO:
+        return None
+    database = db.get_db()
+    return database["plan_cache"] if database is not None else None
+
+async def load_persisted_plan(key):
+    collection = plan_cache_collection()
+    if collection is None:
+        return None
+
+    try:
+        doc = await collection.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+    except Exception as e:
+        log.warning("Plan cache lookup failed: %s", e)
+        return None
+
+    return doc["plan"] if doc else None
+
+async def persist_plan(key, question, plan):
+    collection = plan_cache_collection()
+    if collection is None:
+        return
+
+    try:
+        await collection.replace_one(
+            {"_id": key},
+            {
+                "_id": key,
+                "question": normalize_question(question),
+                "plan": plan,
+                "expires_at": datetime.utcnow() + timedelta(seconds=config.PLAN_CACHE_TTL_SECONDS)
+            },
+            upsert=True
+        )
+    except Exception as e:
+        log.warning("Plan cache write failed: %s", e)
+
+async def build_plan(question, schema):
+    """Plan for question as (plan, planner), where planner names the path
+    that produced it: "rules", "cache" or "llm"."""
+    plan, planner = await find_plan(question, schema)
+    metrics_service.inc("vectora_plans_total", planner=planner)
+    return plan, planner
+
+async def find_plan(question, schema):
+    if config.FAST_PATH_ENABLED:
+        plan = fast_plan(question, schema)
+        if plan is not None:
+            return plan, "rules"
+
+    key = plan_cache_key(question, schema)
+
+    plan = get_cached_plan(key)
+    if plan is not None:
+        plan_cache_stats["hits"] += 1
+        return plan, "cache"
+
+    with span("plan_cache"):
+        plan = await load_persisted_plan(key)
+    if plan is not None:
+        plan_cache_stats["hits"] += 1
+        plan_cache_stats["persistent_hits"] += 1
+        cache_plan(key, plan)
+        return plan, "cache"
+
+    plan_cache_stats["misses"] += 1
+    plan = await llm_build_plan(question, schema)
+
+    cache_plan(key, plan)
+    with span("plan_cache"):
+        await persist_plan(key, question, plan)
+    return plan, "llm"
+
+async def llm_build_plan(question, schema):
     prompt = f"""
 You are a data analyst.
 
-Dataset columns:
-{schema["columns"]}
+Dataset columns (name, dtype, value range or example values):
+{summarize_schema(schema, question)}
 
-Sample rows:
-{schema["sample_rows"]}
+Always use column names exactly as written above.
 
 User question:
 "{question}"
@@ -43,12 +247,22 @@ Allowed operators:
 - mean
 - count
 - clean
+- groupby_sum
+- groupby_mean
+- groupby_count
+- top_k
 
 Rules:
 - If the user asks for advice, recommendations, or how to increase sales,
   you MUST use operator "sales_diagnostics".
+- If they ask what would happen for specific changes (e.g. "what if each driver rose 5% or fell 20%"),
+  add "scenarios" as relative changes (0.05, -0.2).
+- If the user asks to compare or rank groups (e.g. "which category has the most total sales",
+  "average profit per region", "top 5 products by revenue"), use "groupby_sum", "groupby_mean",
+  "groupby_count" or "top_k" with the grouping column as "group_by".
 - If the user explicitly asks to "visualize", "chart", "plot", or "show a graph",
-  you MUST use operator "sales_diagnostics" (treating the visualization target as the target variable).
+  you MUST use operator "sales_diagnostics" (treating the visualization target as the target variable),
+  unless they ask to compare groups, in which case use the grouped operators above.
 - If the user greets or asks a general question not related to data, use operator "chat".
 - If the user asks to clean the data, remove duplicates, or handle missing values, use operator "clean".
 - If the user specifies a cleaning type (e.g., "clean for sentiment analysis", "clean for classification"), add "problem_type".
@@ -57,55 +271,26 @@ JSON formats:
 {{ "operator": "argmax", "metric": "...", "group_by": "..." }}
 {{ "operator": "argmin", "metric": "...", "group_by": "..." }}
 {{ "operator": "lookup", "metric": "...", "filter": {{ "Product ID": "P105" }} }}
+{{ "operator": "lookup", "metric": "...", "filter": {{ "Region": "North", "Month": "Jan" }} }}
 {{ "operator": "sales_diagnostics", "target": "Sales" }}
+{{ "operator": "sales_diagnostics", "target": "Sales", "scenarios": [0.05, -0.2] }}
 {{ "operator": "chat", "reply": "Hello! How can I help you analyze your data today?" }}
 {{ "operator": "sum", "metric": "Revenue" }}
 {{ "operator": "mean", "metric": "Profit" }}
 {{ "operator": "count", "metric": "Product ID" }}
+{{ "operator": "groupby_sum", "metric": "Sales", "group_by": "Category" }}
+{{ "operator": "groupby_mean", "metric": "Profit", "group_by": "Region" }}
+{{ "operator": "groupby_count", "metric": "Order ID", "group_by": "Region" }}
+{{ "operator": "top_k", "metric": "Revenue", "group_by": "Product Name", "agg": "sum", "k": 5, "order": "desc" }}
 {{ "operator": "clean" }}
 {{ "operator": "clean", "problem_type": "sentiment_analysis" }}
 {{ "operator": "clean", "problem_type": "binary_classification", "target": "Churn" }}
 """
 
-    response = client.chat.completions.create(
+    response = await create_chat_completion(
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
         temperature=0
     )
 
     return safe_json_parse(response.choices[0].message.content)
-
-
-    def llm_rephrase_explanation(text):
-        prompt = f"""
-    You are a friendly, intelligent AI assistant speaking to a real human.
-
-    Your goal is to make the response sound:
-    - natural
-    - conversational
-    - confident but not formal
-    - like a smart colleague explaining something
-
-    Strict rules:
-    - Do NOT sound like a report, FAQ, or documentation
-    - Avoid bullet points unless absolutely necessary
-    - Vary sentence length naturally
-    - Use soft transitions (e.g. "What stands out here is...", "One interesting thing is...")
-    - Do NOT repeat phrases like "the data shows" again and again
-    - Do NOT add new facts
-    - Do NOT change any numbers
-    - Do NOT give advice unless already present
-
-    Rewrite the text below following these rules.
-
-    Text:
-    {text}
-    """
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3
-        )
-
-        return response.choices[0].message.content.strip()
@@ -0,0 +1,129 @@
+import time
+import threading
+from contextvars import ContextVar
+from contextlib import contextmanager
+import config
+
+# In-process counters and histograms, rendered in the Prometheus text format
+# by /metrics. Spans time the stages of a request; the timings of the current
+# request are also collected for its Server-Timing header.
+
+lock = threading.Lock()
+metrics = {}   # name -> (type, help)
+counters = {}  # (name, labels) -> value
+histograms = {}  # (name, labels) -> [bucket counts, sum, count]
+gauges = {}  # name -> fn returning the current value
+
+request_timings = ContextVar("request_timings", default=None)
+
+def describe(name, kind, help):
+    metrics[name] = (kind, help)
+
+def label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def inc(name, value=1, **labels):
+    key = (name, label_key(labels))
+    with lock:
+        counters[key] = counters.get(key, 0) + value
+
+def observe(name, value, **labels):
+    key = (name, label_key(labels))
+    with lock:
+        entry = histograms.get(key)
+        if entry is None:
+            entry = histograms[key] = [[0] * len(config.METRICS_BUCKETS), 0.0, 0]
+        for i, bound in enumerate(config.METRICS_BUCKETS):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+def gauge(name, help, fn):
+    describe(name, "gauge", help)
+    gauges[name] = fn
+
+class Span:
+    seconds = None
+
+@contextmanager
+def span(stage):
+    """Time a stage of the current request into vectora_stage_seconds."""
+    timing = Span()
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing.seconds = time.perf_counter() - start
+        observe("vectora_stage_seconds", timing.seconds, stage=stage)
+        timings = request_timings.get()
+        if timings is not None:
+            timings.append((stage, timing.seconds))
+
+def start_request():
+    """Collect the spans of the current request; returns their list."""
+    timings = []
+    request_timings.set(timings)
+    return timings
+
+def server_timing(timings):
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings)
+
+def format_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render():
+    with lock:
+        counter_items = sorted(counters.items())
+        histogram_items = sorted((key, (list(b), s, c)) for key, (b, s, c) in histograms.items())
+
+    lines = []
+    described = set()
+
+    def header(name):
+        if name in described or name not in metrics:
+            return
+        described.add(name)
+        kind, help = metrics[name]
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counter_items:
+        header(name)
+        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+    for (name, labels), (buckets, total, count) in histogram_items:
+        header(name)
+        for bound, n in zip(config.METRICS_BUCKETS, buckets):
+            lines.append(f"{name}_bucket{format_labels(labels, [('le', format_value(float(bound)))])} {n}")
+        lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+        lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+    for name, fn in sorted(gauges.items()):
+        value = fn()
+        if value is None:
+            continue
+        header(name)
+        lines.append(f"{name} {format_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
+describe("vectora_http_requests_total", "counter", "HTTP requests by route, method and status.")
+describe("vectora_http_request_seconds", "histogram", "HTTP request latency by route.")
+describe("vectora_stage_seconds", "histogram", "Time spent in each stage of a request.")
+describe("vectora_operator_seconds", "histogram", "Plan execution time by operator.")
+describe("vectora_plans_total", "counter", "Plans built, by the path that produced them (rules, cache, llm).")
+describe("vectora_llm_requests_total", "counter", "LLM calls by outcome.")
+describe("vectora_llm_tokens_total", "counter", "LLM tokens used, by kind (prompt, completion).")
+describe("vectora_chat_log_writes_total", "counter", "Chat log records by outcome (ok, spilled, replayed, queue_full, dropped).")
@@ -0,0 +1,177 @@
+import copy
+import threading
+from collections import OrderedDict
+import numpy as np
+import config
+from services import metrics_service
+
+# Linear sales models fitted from accumulated normal equations. Fitted models
+# are kept in a bounded LRU keyed on (dataset version, target, features); a
+# dataset version created by appending rows reuses its parent's sufficient
+# statistics and only folds in the new rows.
+
+class LinearModel:
+    def __init__(self, coef, intercept):
+        self.coef_ = coef
+        self.intercept_ = intercept
+
+    def predict(self, X):
+        return np.asarray(X, dtype="float64") @ self.coef_ + self.intercept_
+
+class NormalEquations:
+    """Running X^T X / X^T y for ordinary least squares with an intercept.
+
+    Sums are taken around a shift (the first chunk's means) to keep the
+    cross-products well conditioned.
+    """
+
+    def __init__(self, n_features):
+        self.rows = 0
+        self.shift_x = None
+        self.shift_y = 0.0
+        self.sum_x = np.zeros(n_features)
+        self.sum_y = 0.0
+        self.xtx = np.zeros((n_features, n_features))
+        self.xty = np.zeros(n_features)
+
+    def update(self, X, y):
+        if not len(y):
+            return
+
+        if self.shift_x is None:
+            self.shift_x = X.mean(axis=0)
+            self.shift_y = float(y.mean())
+
+        Xs = X - self.shift_x
+        ys = y - self.shift_y
+
+        self.rows += len(y)
+        self.sum_x += Xs.sum(axis=0)
+        self.sum_y += float(ys.sum())
+        self.xtx += Xs.T @ Xs
+        self.xty += Xs.T @ ys
+
+    def solve(self):
+        if self.rows == 0:
+            raise ValueError("No rows with a target value to fit a model on")
+
+        mean_x = self.sum_x / self.rows
+        mean_y = self.sum_y / self.rows
+
+        # Centred normal equations; lstsq gives the minimum-norm solution when
+        # features are collinear, matching an ordinary least-squares fit
+        xtx = self.xtx - self.rows * np.outer(mean_x, mean_x)
+        xty = self.xty - self.rows * mean_x * mean_y
+        coef = np.linalg.lstsq(xtx, xty, rcond=None)[0]
+
+        intercept = (mean_y + self.shift_y) - (mean_x + self.shift_x) @ coef
+        return LinearModel(coef, float(intercept))
+
+def chunk_arrays(df, features, target, start=0):
+    """(X, y) float arrays over row chunks of df, missing features as 0 and
+    rows without a target skipped."""
+    for begin in range(start, len(df), config.MODEL_CHUNK_ROWS):
+        chunk = df.iloc[begin:begin + config.MODEL_CHUNK_ROWS]
+        X = chunk[features].to_numpy(dtype="float64", na_value=np.nan)
+        y = chunk[target].to_numpy(dtype="float64", na_value=np.nan)
+
+        keep = ~np.isnan(y)
+        X = np.nan_to_num(X[keep], nan=0.0, copy=False)
+        yield X, y[keep]
+
+def frame_arrays(frames, features, target, start=0):
+    """chunk_arrays over a stream of frames, skipping the first `start` rows."""
+    for frame in frames:
+        if start >= len(frame):
+            start -= len(frame)
+            continue
+        yield from chunk_arrays(frame, features, target, start)
+        start = 0
+
+def accumulate(equations, batches):
+    for X, y in batches:
+        equations.update(X, y)
+    return equations
+
+# (dataset version, target, features) -> (NormalEquations, LinearModel)
+model_cache = OrderedDict()
+model_cache_lock = threading.Lock()
+model_cache_stats = {"hits": 0, "misses": 0, "incremental": 0}
+
+def model_cache_hit_ratio():
+    lookups = model_cache_stats["hits"] + model_cache_stats["misses"]
+    return model_cache_stats["hits"] / lookups if lookups else None
+
+# Fits made in plan worker processes are counted there, not here
+metrics_service.gauge(
+    "vectora_model_cache_hit_ratio",
+    "Share of in-process model fits served from the model cache.",
+    model_cache_hit_ratio
+)
+
+def cached_entry(key):
+    with model_cache_lock:
+        entry = model_cache.get(key)
+        if entry is not None:
+            model_cache.move_to_end(key)
+        return entry
+
+def store_entry(key, entry):
+    with model_cache_lock:
+        model_cache[key] = entry
+        model_cache.move_to_end(key)
+        while len(model_cache) > config.MODEL_CACHE_SIZE:
+            model_cache.popitem(last=False)
+
+def version_entries(version):
+    """Cached fits of one dataset version, {key: (NormalEquations, LinearModel)};
+    how fits travel between the server and plan worker processes."""
+    with model_cache_lock:
+        return {key: entry for key, entry in model_cache.items() if key[0] == version}
+
+def store_entries(entries):
+    for key, entry in entries.items():
+        store_entry(key, entry)
+
+def fit_linear_model(df, target, features, cache=None, frames=None):
+    """Fit target ~ features, reusing cached fits for this dataset version.
+
+    `frames`, an iterable of row chunks in dataset order, replaces df when
+    the dataset is streamed from disk instead of held in memory.
+    """
+    version = (cache or {}).get("version")
+    key = (version, target, tuple(features)) if version is not None else None
+
+    if key is not None:
+        entry = cached_entry(key)
+        if entry is not None:
+            model_cache_stats["hits"] += 1
+            return entry[1]
+
+    model_cache_stats["misses"] += 1
+    equations, start = None, 0
+
+    parent = (cache or {}).get("parent")
+    if parent is not None:
+        # Rows were appended to a version we may already have fitted
+        parent_version, parent_rows = parent
+        entry = cached_entry((parent_version, target, tuple(features)))
+        if entry is not None:
+            equations, start = copy.deepcopy(entry[0]), parent_rows
+            model_cache_stats["incremental"] += 1
+
+    if equations is None:
+        equations = NormalEquations(len(features))
+
+    if frames is None:
+        batches = chunk_arrays(df, features, target, start)
+    else:
+        batches = frame_arrays(frames, features, target, start)
+
+    accumulate(equations, batches)
+    model = equations.solve()
+
+    if key is not None:
+        store_entry(key, (equations, model))
+
+    return model
@@ -0,0 +1,203 @@
+import math
+import numpy as np
+import pandas as pd
+import config
+
+# Streaming sketches for columns too large for exact value_counts/nunique:
+# Count-Min with heavy-hitter tracking for frequent values (mode, class
+# balance), HyperLogLog for distinct counts and a merging t-digest for
+# quantiles. Columns are consumed in SKETCH_CHUNK_ROWS chunks, so memory is
+# bounded by the chunk and sketch sizes rather than the column's cardinality.
+
+MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+def hash_values(values):
+    return pd.util.hash_array(np.asarray(values))
+
+def mix(hashes, seed):
+    """A differently seeded 64-bit hash derived from hashes (splitmix64 finalizer)."""
+    with np.errstate(over="ignore"):
+        z = hashes + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+def bit_length(values):
+    """Bit length of each uint64. Values are rounded to float64 first, which
+    only overstates lengths within 2**-53 of a power of two."""
+    return np.frexp(values.astype(np.float64))[1]
+
+class CountMinSketch:
+    """Frequency estimates that overcount by at most epsilon * total with
+    probability 1 - delta."""
+
+    def __init__(self, epsilon=None, delta=None):
+        epsilon = epsilon or config.SKETCH_EPSILON
+        delta = delta or config.SKETCH_DELTA
+        self.width = int(math.ceil(math.e / epsilon))
+        self.depth = int(math.ceil(math.log(1 / delta)))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, hashes):
+        return [(mix(hashes, row + 1) % np.uint64(self.width)).astype(np.intp) for row in range(self.depth)]
+
+    def update(self, hashes, counts):
+        for row, cols in enumerate(self._columns(hashes)):
+            self.table[row] += np.bincount(cols, weights=counts, minlength=self.width).astype(np.int64)
+        self.total += int(counts.sum())
+
+    def estimate(self, hashes):
+        return np.min([self.table[row][cols] for row, cols in enumerate(self._columns(hashes))], axis=0)
+
+class HeavyHitters:
+    """The k most frequent values of a stream, with Count-Min estimates."""
+
+    def __init__(self, k=None, epsilon=None, delta=None):
+        self.k = k or config.SKETCH_HEAVY_HITTERS
+        self.sketch = CountMinSketch(epsilon, delta)
+        # hash -> a value with that hash
+        self.candidates = {}
+
+    def update(self, values, counts):
+        """Add distinct values with their counts in this chunk."""
+        hashes = hash_values(values)
+        self.sketch.update(hashes, counts)
+
+        if len(values) > self.k:
+            # Only this chunk's most frequent values can enter the candidate set
+            top = np.argpartition(-counts, self.k - 1)[:self.k]
+            hashes, values = hashes[top], values[top]
+
+        for h, value in zip(hashes.tolist(), values):
+            self.candidates.setdefault(h, value)
+
+        self._prune()
+
+    def _prune(self):
+        if len(self.candidates) <= 2 * self.k:
+            return
+        hashes = np.fromiter(self.candidates.keys(), dtype=np.uint64, count=len(self.candidates))
+        keep = np.argsort(-self.sketch.estimate(hashes), kind="stable")[:self.k]
+        self.candidates = {int(hashes[i]): self.candidates[int(hashes[i])] for i in keep}
+
+    def top(self, n=None):
+        """[(value, estimated count)] by decreasing estimate."""
+        if not self.candidates:
+            return []
+        hashes = np.fromiter(self.candidates.keys(), dtype=np.uint64, count=len(self.candidates))
+        estimates = self.sketch.estimate(hashes)
+        order = np.argsort(-estimates, kind="stable")[:n or self.k]
+        return [(self.candidates[int(hashes[i])], int(estimates[i])) for i in order]
+
+class HyperLogLog:
+    """Distinct count with a relative standard error of about `error`."""
+
+    def __init__(self, error=None):
+        error = error or config.SKETCH_HLL_ERROR
+        self.p = min(max(int(math.ceil(math.log2((1.04 / error) ** 2))), 4), 18)
+        self.m = 1 << self.p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, hashes):
+        hashes = mix(hashes, 0)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        rest = (hashes << np.uint64(self.p)) & MASK64
+        rank = np.minimum(64 - bit_length(rest) + 1, 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return estimate
+
+class TDigest:
+    """Merging t-digest; larger compression means more centroids and
+    tighter quantile estimates, especially in the tails."""
+
+    def __init__(self, compression=None):
+        self.compression = compression or config.SKETCH_TDIGEST_COMPRESSION
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self._merge(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(len(values))]))
+
+    def _merge(self, means, weights):
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+
+        total = weights.sum()
+        # k1 scale function: centroids are small near the tails
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        groups = np.floor(k - k.min()).astype(np.intp)
+
+        merged_weights = np.bincount(groups, weights=weights)
+        merged_means = np.bincount(groups, weights=means * weights)
+        used = merged_weights > 0
+        self.weights = merged_weights[used]
+        self.means = merged_means[used] / self.weights
+
+    def quantile(self, q):
+        if not len(self.means):
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+        positions = (np.cumsum(self.weights) - self.weights / 2) / self.weights.sum()
+        return float(np.interp(q, positions, self.means))
+
+def use_sketches(series):
+    mode = config.SKETCH_MODE
+    return mode == "on" or (mode == "auto" and len(series) >= config.SKETCH_MIN_ROWS)
+
+def chunk_counts(series):
+    """(distinct values, counts) for each SKETCH_CHUNK_ROWS chunk of series,
+    skipping nulls; sketches then only hash each distinct value once."""
+    for start in range(0, len(series), config.SKETCH_CHUNK_ROWS):
+        codes, uniques = pd.factorize(series.iloc[start:start + config.SKETCH_CHUNK_ROWS])
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        yield np.asarray(uniques), counts
+
+def heavy_hitters(series, k=None):
+    hitters = HeavyHitters(k)
+    for values, counts in chunk_counts(series):
+        hitters.update(values, counts)
+    return hitters
+
+def approx_mode(series):
+    # Tracking only each chunk's top value would miss a mode that is
+    # everywhere a runner-up; keep SKETCH_HEAVY_HITTERS candidates instead
+    top = heavy_hitters(series).top(1)
+    return top[0][0] if top else None
+
+def approx_distinct(series):
+    hll = HyperLogLog()
+    for values, _ in chunk_counts(series):
+        hll.update(hash_values(values))
+    return hll.count()
+
+def approx_value_counts(series, n, normalize=False):
+    """Estimated value_counts().head(n), as a Series."""
+    hitters = heavy_hitters(series, max(n, config.SKETCH_HEAVY_HITTERS))
+    top = hitters.top(n)
+    counts = pd.Series([c for _, c in top], index=[v for v, _ in top], name=series.name, dtype="float64")
+    if normalize and hitters.sketch.total:
+        counts = counts / hitters.sketch.total
+    return counts
+
+def approx_quantiles(series, qs):
+    digest = TDigest()
+    values = series.dropna()
+    for start in range(0, len(values), config.SKETCH_CHUNK_ROWS):
+        digest.update(values.iloc[start:start + config.SKETCH_CHUNK_ROWS].to_numpy(dtype="float64"))
+    return [digest.quantile(q) for q in qs]
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# Column statistics cached per dataset version. `cache` is the dict the
+# registry keeps for the current version of a dataset (state.Dataset.cache);
+# it is replaced on every state.set_df, which invalidates everything here.
+
+def compute_numeric_stats(df, stats):
+    """Fill stats for every numeric column of df not cached yet, in one pass."""
+    columns = [c for c in df.select_dtypes(include=["number"]).columns if c not in stats]
+    if not columns:
+        return
+
+    block = df[columns]
+    sums, means, counts = block.sum(), block.mean(), block.count()
+    mins, maxs = block.min(), block.max()
+
+    for col in columns:
+        count = int(counts[col])
+        entry = {
+            "sum": float(sums[col]),
+            "mean": float(means[col]),
+            "count": count,
+            "nulls": len(df) - count,
+            "min": float(mins[col]),
+            "max": float(maxs[col]),
+            "argmin": None,
+            "argmax": None
+        }
+
+        if count:
+            values = block[col].to_numpy(dtype="float64", na_value=np.nan)
+            entry["argmin"] = int(np.nanargmin(values))
+            entry["argmax"] = int(np.nanargmax(values))
+
+        stats[col] = entry
+
+def column_stats(df, column, cache):
+    stats = cache.setdefault("column_stats", {})
+
+    if column not in stats and pd.api.types.is_numeric_dtype(df[column]):
+        compute_numeric_stats(df, stats)
+
+    if column not in stats:
+        # Non-numeric (and boolean) columns only get counts
+        count = int(df[column].count())
+        stats[column] = {"count": count, "nulls": len(df) - count}
+
+    return stats[column]
+
+def running_totals(columns):
+    return {"sum": np.zeros(len(columns)), "count": np.zeros(len(columns)), "done": False}
+
+def tally_frames(frames, columns, totals):
+    """Pass frames through unchanged while adding each column's sum and
+    non-null count to totals; totals["done"] is set once frames run out."""
+    for frame in frames:
+        block = frame[columns]
+        totals["sum"] += block.sum().to_numpy(dtype="float64")
+        totals["count"] += block.count().to_numpy(dtype="float64")
+        yield frame
+    totals["done"] = True
+
+def totals_means(totals):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return totals["sum"] / totals["count"]
@@ -0,0 +1,129 @@
+import os
+import json
+import pyarrow as pa
+import config
+
+# Datasets are persisted as uncompressed Arrow IPC files so they can be
+# memory-mapped back without a parse step and read one column at a time.
+
+OWNER_KEY = b"vectora.owner"
+SCHEMA_KEY = b"vectora.schema"
+
+def dataset_path(name):
+    return os.path.join(config.DATA_DIR, f"{name}.arrow")
+
+def write_dataset(df, name, owner=None, schema=None, path=None):
+    """Write df to DATA_DIR/<name>.arrow (or path) atomically and return the path.
+
+    The column schema, if given, is stored in the file metadata so it can be
+    read back without touching any rows.
+    """
+    os.makedirs(config.DATA_DIR, exist_ok=True)
+    path = path or dataset_path(name)
+    tmp_path = f"{path}.tmp"
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    if owner is not None:
+        metadata[OWNER_KEY] = owner.encode()
+    if schema is not None:
+        metadata[SCHEMA_KEY] = json.dumps(schema, default=str).encode()
+    table = table.replace_schema_metadata(metadata)
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=config.STORE_BATCH_ROWS)
+
+    os.replace(tmp_path, path)
+    return path
+
+def write_frames(frames, path, owner=None):
+    """Write a stream of DataFrames with the same columns to one Arrow file at
+    path, holding only one frame at a time, and return the path.
+
+    Every frame is converted to the first frame's schema, so a later frame
+    whose values do not fit it raises (pyarrow.ArrowInvalid/ArrowTypeError).
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    writer = None
+
+    try:
+        with pa.OSFile(path, "wb") as sink:
+            for df in frames:
+                if writer is None:
+                    schema = pa.Schema.from_pandas(df, preserve_index=False)
+                    if owner is not None:
+                        schema = schema.with_metadata({**schema.metadata, OWNER_KEY: owner.encode()})
+                    writer = pa.ipc.new_file(sink, schema)
+
+                table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+                writer.write_table(table, max_chunksize=config.STORE_BATCH_ROWS)
+
+            if writer is None:
+                raise ValueError("No frames to write")
+            writer.close()
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    return path
+
+def dataset_owner(path):
+    metadata = open_dataset(path).schema.metadata or {}
+    owner = metadata.get(OWNER_KEY)
+    return owner.decode() if owner is not None else None
+
+def open_dataset(path):
+    return pa.ipc.open_file(pa.memory_map(path, "r"))
+
+def read_table(path, columns=None):
+    table = open_dataset(path).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    return table
+
+def load_dataset(path, columns=None):
+    # split_blocks keeps numeric columns as zero-copy views over the mapping
+    return read_table(path, columns).to_pandas(split_blocks=True)
+
+def empty_frame(path):
+    """Zero-row frame with the dataset's columns and dtypes."""
+    return open_dataset(path).schema.empty_table().to_pandas()
+
+def iter_frames(path, columns=None):
+    """The dataset as a stream of DataFrames, one record batch (at most
+    STORE_BATCH_ROWS rows) at a time and in row order."""
+    reader = open_dataset(path)
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        if columns is not None:
+            batch = batch.select(columns)
+        yield batch.to_pandas(split_blocks=True)
+
+def dataset_dtypes(schema):
+    """Pandas dtypes recorded in the Arrow schema when the file was written."""
+    meta = schema.pandas_metadata or {}
+    recorded = {c["field_name"]: c["numpy_type"] for c in meta.get("columns", [])}
+    return {
+        name: recorded.get(name, str(schema.field(name).type))
+        for name in schema.names
+    }
+
+def dataset_schema(path, sample_size=3):
+    """Column schema read from file metadata plus the first few rows only."""
+    reader = open_dataset(path)
+
+    stored = (reader.schema.metadata or {}).get(SCHEMA_KEY)
+    if stored is not None:
+        return json.loads(stored)
+    sample = []
+    if reader.num_record_batches:
+        batch = reader.get_batch(0).slice(0, sample_size)
+        sample = batch.to_pandas().to_dict(orient="records")
+
+    return {
+        "columns": list(reader.schema.names),
+        "dtypes": dataset_dtypes(reader.schema),
+        "rows": reader.read_all().num_rows,
+        "sample_rows": sample
+    }
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+import config
+from database import db
+
+# Paged reads of users and chat history. Pages are cursor-based rather than
+# skip/limit: each page starts where the previous one ended, so fetching page
+# n costs the same index seek as page 1.
+
+EPOCH = datetime(1970, 1, 1)
+
+# Fields returned for users. Password hashes never leave the database, and
+# neither do _ids: a user's _id is the user_id every ownership check trusts.
+USER_FIELDS = {"_id": 0, "email": 1, "username": 1, "created_at": 1}
+CHAT_FIELDS = {"question": 1, "answer": 1, "timestamp": 1}
+
+def page_size(limit):
+    if limit is None:
+        return config.PAGE_SIZE
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    return min(limit, config.MAX_PAGE_SIZE)
+
+def encode_chat_cursor(chat):
+    # Mongo stores datetimes with millisecond precision, so this round-trips exactly
+    millis = (chat["timestamp"] - EPOCH) // timedelta(milliseconds=1)
+    return f"{millis}.{chat['_id']}"
+
+def decode_chat_cursor(cursor):
+    millis, _, oid = cursor.partition(".")
+    try:
+        return EPOCH + timedelta(milliseconds=int(millis)), ObjectId(oid)
+    except (ValueError, InvalidId, TypeError):
+        raise ValueError("Invalid cursor")
+
+def serialize_chat(chat):
+    chat = dict(chat)
+    chat["_id"] = str(chat["_id"])
+    return chat
+
+async def list_users(limit=None, after=None):
+    """A page of users in email order (the unique email index), starting
+    after the `after` cursor. Returns (users, next cursor or None)."""
+    limit = page_size(limit)
+    query = {"email": {"$gt": after}} if after else {}
+
+    cursor = db.get_db()["ai.Users"].find(query, USER_FIELDS).sort("email", ASCENDING).limit(limit + 1)
+    users = await cursor.to_list(length=limit + 1)
+
+    next_cursor = users[limit - 1]["email"] if len(users) > limit else None
+    return users[:limit], next_cursor
+
+async def chat_history(user_id, limit=None, before=None):
+    """A page of user_id's chats, newest first, starting after the `before`
+    cursor; the (user_id, timestamp, _id) index serves both the filter and
+    the order. Returns (chats, next cursor or None)."""
+    limit = page_size(limit)
+    query = {"user_id": user_id}
+    if before:
+        timestamp, oid = decode_chat_cursor(before)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": oid}},
+        ]
+
+    cursor = (
+        db.get_db()["chats"]
+        .find(query, CHAT_FIELDS)
+        .sort([("timestamp", DESCENDING), ("_id", DESCENDING)])
+        .limit(limit + 1)
+    )
+    chats = await cursor.to_list(length=limit + 1)
+
+    next_cursor = encode_chat_cursor(chats[limit - 1]) if len(chats) > limit else None
+    return [serialize_chat(c) for c in chats[:limit]], next_cursor
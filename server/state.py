@@ -1,12 +1,255 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 import pandas as pd
+import config
+from logger import log
+from services import store_service
+from services.data_service import build_column_schema
 
-# Global state for the dataframe
-df = None
+# Dataset loaded from config.CSV_PATH at startup. It is shared by every user,
+# so it is read-only.
+DEFAULT_DATASET = "default"
 
-def set_df(new_df):
-    global df
-    df = new_df
+class Dataset:
+    """One registered dataset. `source` is the Arrow file backing it; when
+    `df` is None the frame has been evicted (or not loaded yet) and is
+    mapped back from `source` on first use."""
 
-def get_df():
-    global df
+    def __init__(self, dataset_id, owner=None):
+        self.id = dataset_id
+        self.owner = owner
+        self.df = None
+        self.source = None
+        self.nbytes = 0
+        self.version = 0
+        # Column schema of the current version, built once and reused by /ask
+        self.schema = None
+        # Derived data (statistics, ...) for the current version; replaced, not
+        # cleared, on every change so readers holding the old dict stay consistent
+        self.cache = {}
+        self.refs = 0
+        self.lock = threading.RLock()
+
+    def reset_cache(self, parent=None):
+        self.cache = {"version": (self.id, self.version)}
+        if parent is not None:
+            # (parent version, parent row count) when this version only appended rows
+            self.cache["parent"] = parent
+
+    @property
+    def resident(self):
+        return self.df is not None
+
+    def has_data(self):
+        return self.df is not None or self.source is not None
+
+# Registry of datasets in least-recently-used order
+datasets = OrderedDict()
+registry_lock = threading.RLock()
+
+def new_dataset_id():
+    return uuid.uuid4().hex
+
+def _frame_nbytes(df):
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+def _touch(dataset):
+    with registry_lock:
+        datasets.move_to_end(dataset.id)
+
+def get_dataset(dataset_id=DEFAULT_DATASET, user_id=None):
+    """Registered dataset visible to user_id, or None."""
+    dataset = datasets.get(dataset_id or DEFAULT_DATASET)
+    if dataset is None:
+        return None
+    if dataset.owner is not None and dataset.owner != user_id:
+        return None
+    return dataset
+
+def can_write(dataset, user_id):
+    """Whether user_id may replace, append to or clean the dataset in place:
+    only its owner can, and the shared default dataset is read-only. Anonymous
+    uploads have no owner and stay writable by whoever holds their id."""
+    return dataset.id != DEFAULT_DATASET and dataset.owner == user_id
+
+def _get_or_create(dataset_id, owner):
+    with registry_lock:
+        dataset = datasets.get(dataset_id)
+        if dataset is None:
+            dataset = Dataset(dataset_id, owner)
+            datasets[dataset_id] = dataset
+        return dataset
+
+def set_df(new_df, dataset_id=DEFAULT_DATASET, owner=None, persist=True, parent=None, source=None):
+    """Make new_df the next version of a dataset. `source` is an Arrow file
+    already holding new_df (e.g. streamed there by an upload); it is moved
+    into place instead of writing the frame again."""
+    dataset = _get_or_create(dataset_id or DEFAULT_DATASET, owner)
+
+    with dataset.lock:
+        dataset.df = new_df
+        dataset.source = None
+        dataset.nbytes = _frame_nbytes(new_df) if new_df is not None else 0
+        dataset.version += 1
+        dataset.schema = build_column_schema(new_df) if new_df is not None else None
+        dataset.reset_cache(parent)
+
+        if source is not None:
+            dataset.source = store_service.dataset_path(dataset.id)
+            os.replace(source, dataset.source)
+        elif new_df is not None and persist:
+            try:
+                dataset.source = store_service.write_dataset(
+                    new_df, dataset.id, owner=dataset.owner, schema=dataset.schema
+                )
+            except Exception as e:
+                # Frames Arrow cannot represent (e.g. mixed-type object columns) stay in memory only
+                log.warning("Could not persist dataset %s: %s", dataset.id, e)
+
+    _touch(dataset)
+    evict()
+    return dataset
+
+def append_df(rows, dataset_id=DEFAULT_DATASET, owner=None):
+    """Append rows to an existing dataset as a new version that remembers its parent."""
+    dataset = datasets[dataset_id or DEFAULT_DATASET]
+
+    with dataset.lock:
+        base = get_df(dataset.id)
+        if base is None:
+            return set_df(rows, dataset.id, owner)
+
+        if list(rows.columns) != list(base.columns):
+            raise ValueError("Appended data must have the same columns as the dataset")
+
+        parent = (dataset.cache.get("version"), len(base))
+        combined = pd.concat([base, rows], ignore_index=True)
+        return set_df(combined, dataset.id, owner, parent=parent)
+
+def replace_source(path, dataset_id=DEFAULT_DATASET):
+    """Make the Arrow file at path (written elsewhere, e.g. by a plan worker)
+    the next version of a dataset without loading it."""
+    dataset = datasets[dataset_id or DEFAULT_DATASET]
+
+    with dataset.lock:
+        target = store_service.dataset_path(dataset.id)
+        os.replace(path, target)
+        dataset.df = None
+        dataset.nbytes = 0
+        dataset.source = target
+        dataset.version += 1
+        dataset.schema = None
+        dataset.reset_cache()
+
+    _touch(dataset)
+    return dataset
+
+def restore():
+    """Register every dataset persisted by a previous run, without loading them."""
+    if not os.path.isdir(config.DATA_DIR):
+        return 0
+
+    restored = 0
+    for name in os.listdir(config.DATA_DIR):
+        if name.endswith((".result", ".ingest")):
+            # Plan worker output or an upload never adopted before the last shutdown
+            os.remove(os.path.join(config.DATA_DIR, name))
+            continue
+        if not name.endswith(".arrow"):
+            continue
+
+        path = os.path.join(config.DATA_DIR, name)
+        try:
+            owner = store_service.dataset_owner(path)
+        except Exception as e:
+            log.warning("Skipping unreadable dataset %s: %s", path, e)
+            continue
+
+        dataset = _get_or_create(name[:-len(".arrow")], owner)
+        with dataset.lock:
+            dataset.source = path
+            dataset.version += 1
+            dataset.schema = None
+            dataset.reset_cache()
+        restored += 1
+
+    return restored
+
+def has_data(dataset_id=DEFAULT_DATASET):
+    dataset = datasets.get(dataset_id or DEFAULT_DATASET)
+    return dataset is not None and dataset.has_data()
+
+def get_df(dataset_id=DEFAULT_DATASET, columns=None):
+    dataset = datasets.get(dataset_id or DEFAULT_DATASET)
+    if dataset is None:
+        return None
+
+    with dataset.lock:
+        df = dataset.df
+        if df is None and dataset.source is not None:
+            if columns is not None:
+                # Map back only the columns the caller needs
+                return store_service.load_dataset(dataset.source, columns)
+
+            df = store_service.load_dataset(dataset.source)
+            dataset.df = df
+            dataset.nbytes = _frame_nbytes(df)
+
+    _touch(dataset)
+    evict()
     return df
+
+def get_schema(dataset_id=DEFAULT_DATASET):
+    dataset = datasets.get(dataset_id or DEFAULT_DATASET)
+    if dataset is None:
+        return None
+
+    with dataset.lock:
+        if dataset.schema is None:
+            if dataset.df is not None:
+                dataset.schema = build_column_schema(dataset.df)
+            elif dataset.source is not None:
+                dataset.schema = store_service.dataset_schema(dataset.source)
+        return dataset.schema
+
+@contextmanager
+def acquire(dataset_id=DEFAULT_DATASET):
+    """Pin a dataset in memory for the duration of the block."""
+    dataset = datasets[dataset_id or DEFAULT_DATASET]
+    with dataset.lock:
+        dataset.refs += 1
+    try:
+        yield dataset
+    finally:
+        with dataset.lock:
+            dataset.refs -= 1
+        evict()
+
+def resident_bytes():
+    return sum(d.nbytes for d in list(datasets.values()) if d.resident)
+
+def evict():
+    """Drop least-recently-used frames that are persisted and unpinned until
+    resident data fits DATASET_MEMORY_BUDGET_MB."""
+    budget = config.DATASET_MEMORY_BUDGET_MB * 1024 * 1024
+
+    with registry_lock:
+        used = resident_bytes()
+        for dataset in list(datasets.values()):
+            if used <= budget:
+                break
+            if not dataset.resident or dataset.source is None:
+                continue
+            if not dataset.lock.acquire(blocking=False):
+                continue
+            try:
+                if dataset.refs == 0:
+                    dataset.df = None
+                    dataset.reset_cache()
+                    used -= dataset.nbytes
+                    log.info("Evicted dataset %s from memory", dataset.id)
+            finally:
+                dataset.lock.release()
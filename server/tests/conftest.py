@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# config reads the environment at import time, so everything the server
+# writes to disk is pointed at a scratch directory before any server module
+# is imported
+scratch = tempfile.mkdtemp(prefix="vectora-tests-")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("DATA_DIR", os.path.join(scratch, "data"))
+os.environ.setdefault("UPLOAD_DIR", os.path.join(scratch, "uploads"))
+os.environ.setdefault("JOB_DIR", os.path.join(scratch, "jobs"))
+os.environ.setdefault("EXPORT_DIR", os.path.join(scratch, "exports"))
+os.environ.setdefault("CHAT_LOG_SPILL_PATH", os.path.join(scratch, "chat_logs.spill.jsonl"))
+# Plans run inline unless a test starts worker processes itself
+os.environ.setdefault("PLAN_WORKERS", "0")
+os.environ.pop("MONGO_URI", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import state
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    state.datasets.clear()
+    yield
+    state.datasets.clear()
@@ -0,0 +1,92 @@
+import asyncio
+import time
+import pytest
+from fastapi.testclient import TestClient
+from passlib.hash import bcrypt
+from main import app
+from routers import auth
+from services import auth_service
+from services.auth_service import RateLimiter, limiter_key
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+def test_attempts_over_the_limit_wait_for_the_oldest_to_expire(clock):
+    limiter = RateLimiter(limit=3, window=60)
+
+    for _ in range(3):
+        assert limiter.hit("login:a") == 0
+        clock.now += 10
+
+    assert limiter.hit("login:a") == pytest.approx(30)
+    assert limiter.hit("login:b") == 0  # other keys are unaffected
+
+    clock.now += 30
+    assert limiter.hit("login:a") == 0
+
+def test_refused_attempts_are_not_counted(clock):
+    limiter = RateLimiter(limit=1, window=60)
+    limiter.hit("k")
+
+    for _ in range(5):
+        clock.now += 10
+        limiter.hit("k")
+
+    clock.now += 10
+    assert limiter.hit("k") == 0
+
+def test_reset_clears_a_key(clock):
+    limiter = RateLimiter(limit=1, window=60)
+    limiter.hit("k")
+
+    limiter.reset("k")
+
+    assert limiter.hit("k") == 0
+
+def test_idle_keys_are_pruned_when_full(clock):
+    limiter = RateLimiter(limit=1, window=60, max_keys=2)
+    limiter.hit("old")
+    clock.now += 30
+    limiter.hit("recent")
+    clock.now += 40
+
+    limiter.hit("new")
+
+    assert set(limiter.attempts) == {"recent", "new"}
+
+def test_limiter_key_ignores_case_and_whitespace():
+    assert limiter_key("login", "  Alice@Example.COM ") == limiter_key("login", "alice@example.com")
+    assert limiter_key("login", "a@b.c") != limiter_key("register", "a@b.c")
+
+def test_login_burst_is_refused_with_retry_after(monkeypatch):
+    monkeypatch.setattr(auth, "login_limiter", RateLimiter(limit=2, window=60))
+    client = TestClient(app)
+    credentials = {"email": "alice@example.com", "password": "wrong"}
+
+    # No database here, so allowed attempts fail further on with a 503
+    assert [client.post("/auth/login", json=credentials).status_code for _ in range(2)] == [503, 503]
+
+    refused = client.post("/auth/login", json={**credentials, "email": " ALICE@example.com"})
+    assert refused.status_code == 429
+    assert 1 <= int(refused.headers["Retry-After"]) <= 61
+
+def test_hash_with_other_rounds_is_upgraded_on_login():
+    stored = bcrypt.using(rounds=4).hash("hunter2")
+
+    async def verify(password):
+        return await auth_service.verify_password(password, stored)
+
+    assert asyncio.run(verify("wrong")) == (False, None)
+    matches, new_hash = asyncio.run(verify("hunter2"))
+    assert matches
+    assert bcrypt.from_string(new_hash).rounds == auth_service.config.BCRYPT_ROUNDS
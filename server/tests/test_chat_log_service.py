@@ -0,0 +1,118 @@
+import asyncio
+import os
+import pytest
+from services import chat_log_service
+from services.chat_log_service import ChatLogWriter
+
+class FakeCollection:
+    def __init__(self):
+        self.batches = []
+        self.down = False
+        self.gate = None  # asyncio.Event holding inserts back while unset
+
+    async def insert_many(self, docs, ordered=True):
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.down:
+            raise ConnectionError("mongo is down")
+        self.batches.append([doc["n"] for doc in docs])
+
+    @property
+    def written(self):
+        return [n for batch in self.batches for n in batch]
+
+@pytest.fixture
+def collection():
+    return FakeCollection()
+
+@pytest.fixture
+def writer(collection, tmp_path, monkeypatch):
+    config = chat_log_service.config
+    monkeypatch.setattr(config, "CHAT_LOG_BATCH_SIZE", 3)
+    monkeypatch.setattr(config, "CHAT_LOG_FLUSH_SECONDS", 0.05)
+    monkeypatch.setattr(config, "CHAT_LOG_REPLAY_SECONDS", 3600)
+    return ChatLogWriter(lambda: collection, str(tmp_path / "spill.jsonl"))
+
+def spilled(writer):
+    if not os.path.exists(writer.spill_path):
+        return 0
+    with open(writer.spill_path) as fh:
+        return sum(1 for _ in fh)
+
+async def wait_until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out waiting"
+        await asyncio.sleep(0.01)
+
+def test_idle_writer_keeps_running_past_the_flush_interval(writer, collection):
+    async def scenario():
+        writer.start()
+        await asyncio.sleep(0.3)  # several empty flush intervals
+        assert not writer.task.done()
+
+        await writer.enqueue({"n": 1})
+        await wait_until(lambda: collection.written == [1])
+        await writer.close()
+
+    asyncio.run(scenario())
+
+def test_records_are_written_in_batches(writer, collection):
+    async def scenario():
+        writer.start()
+        for n in range(7):
+            await writer.enqueue({"n": n})
+        await wait_until(lambda: len(collection.written) == 7)
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert collection.batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+def test_failed_batches_are_spilled_and_replayed(writer, collection, monkeypatch):
+    async def scenario():
+        collection.down = True
+        writer.start()
+        for n in range(4):
+            await writer.enqueue({"n": n})
+        await wait_until(lambda: spilled(writer) == 4)
+
+        collection.down = False
+        monkeypatch.setattr(chat_log_service.config, "CHAT_LOG_REPLAY_SECONDS", 0)
+        await wait_until(lambda: len(collection.written) == 4)
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert sorted(collection.written) == [0, 1, 2, 3]
+    assert spilled(writer) == 0
+    assert not os.path.exists(f"{writer.spill_path}.replay")
+
+def test_full_queue_spills_instead_of_waiting(writer, collection, monkeypatch):
+    monkeypatch.setattr(chat_log_service.config, "CHAT_LOG_BATCH_SIZE", 1)
+    monkeypatch.setattr(chat_log_service.config, "CHAT_LOG_QUEUE_SIZE", 1)
+    monkeypatch.setattr(chat_log_service.config, "CHAT_LOG_ENQUEUE_TIMEOUT_SECONDS", 0.01)
+
+    async def scenario():
+        collection.gate = asyncio.Event()
+        writer.start()
+        await writer.enqueue({"n": 0})
+        await wait_until(lambda: writer.depth() == 0)  # taken by the blocked writer
+        await writer.enqueue({"n": 1})
+        await writer.enqueue({"n": 2})  # queue full
+
+        assert spilled(writer) == 1
+        collection.gate.set()
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert collection.written == [0, 1]
+
+def test_close_flushes_queued_records(writer, collection):
+    async def scenario():
+        writer.start()
+        await writer.enqueue({"n": 1})
+        await writer.enqueue({"n": 2})
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert collection.written == [1, 2]
+    assert spilled(writer) == 0
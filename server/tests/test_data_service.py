@@ -0,0 +1,136 @@
+import asyncio
+import random
+import pandas as pd
+import pyarrow as pa
+import pytest
+import state
+from services import data_service
+from services.clean_service import run_clean_job
+from services.data_service import clean_text, clean_text_array, clean_text_series
+from services.job_service import create_job, get_job
+
+def random_text(rng):
+    # Biased towards the characters where Arrow's and Python's Unicode
+    # handling differ: sigmas, case-ignorable marks, odd whitespace
+    tricky = "ΣσςAbIİ'’ .,-́­ẞǅʰͅ\x1c\x85　Ᲊ"
+    chars = []
+    for _ in range(rng.randint(0, 12)):
+        pick = rng.random()
+        if pick < 0.4:
+            chars.append(rng.choice(tricky))
+        elif pick < 0.7:
+            chars.append(chr(rng.randint(0x20, 0x2FF)))
+        else:
+            chars.append(chr(rng.randint(0x20, 0x2FFFF)))
+    return "".join(c for c in chars if not 0xD800 <= ord(c) <= 0xDFFF)
+
+def test_arrow_cleaning_matches_clean_text_on_random_unicode():
+    rng = random.Random(17)
+    texts = [random_text(rng) for _ in range(20_003)]
+
+    cleaned = clean_text_array(pa.array(texts, type=pa.large_string())).to_pylist()
+
+    assert [t for t, c in zip(texts, cleaned) if c != clean_text(t)] == []
+
+def test_arrow_cleaning_matches_clean_text_on_ascii():
+    rng = random.Random(5)
+    texts = ["".join(chr(rng.randint(0, 127)) for _ in range(rng.randint(0, 20))) for _ in range(20_000)]
+
+    cleaned = clean_text_array(pa.array(texts, type=pa.large_string())).to_pylist()
+
+    assert [t for t, c in zip(texts, cleaned) if c != clean_text(t)] == []
+
+@pytest.mark.parametrize("text", [
+    "ΟΔΟΣ", "ΟΔΟΣ ΚΑΛΟΣ.", "ΣΑΣ", "Σ", "AΣ'", "AΣ'B", "A'Σ", "ΣΣ", "AΣΣ", "1Σ", "AΣ́ B",
+])
+def test_capital_sigma_follows_str_lower(text):
+    assert clean_text_array(pa.array([text], type=pa.large_string()))[0].as_py() == clean_text(text)
+
+def test_clean_text_series_handles_non_strings_and_chunks(monkeypatch):
+    monkeypatch.setattr(data_service.config, "NLP_CHUNK_ROWS", 2)
+    monkeypatch.setattr(data_service.config, "NLP_WORKERS", 2)
+    series = pd.Series(["Hello,  World!", None, 42, "ΟΔΟΣ", "  İstanbul  "], index=[5, 4, 3, 2, 1])
+
+    cleaned = clean_text_series(series)
+
+    assert cleaned.tolist() == [clean_text(v) for v in series]
+    assert cleaned.index.tolist() == [5, 4, 3, 2, 1]
+
+def reviews():
+    # Nothing to fill or drop, so each stage gets the registry's frame itself
+    return pd.DataFrame({
+        "Review": ["Great product, really!!", "Awful. Would not buy again", "Meh...  it is fine I guess"],
+        "Rating": [5.0, 1.0, 3.0],
+        "Label": ["pos", "neg", "neg"],
+    })
+
+@pytest.mark.parametrize("problem_type, target", [
+    ("sentiment_analysis", None),
+    ("general", None),
+    ("binary_classification", "Label"),
+])
+def test_clean_job_leaves_the_source_frame_alone(problem_type, target):
+    dataset = state.set_df(reviews(), "ds", owner="alice", persist=False)
+    source = state.get_df("ds")
+    job = create_job("clean", dataset_id="ds", owner="alice")
+
+    asyncio.run(run_clean_job(job["id"], dataset, target, problem_type))
+
+    assert get_job(job["id"])["status"] == "done"
+    assert state.get_df("ds") is source
+    pd.testing.assert_frame_equal(source, reviews())
+
+def labelled(counts):
+    labels = [label for label, n in counts.items() for _ in range(n)]
+    return pd.DataFrame({"Label": labels, "Value": range(len(labels))})
+
+@pytest.mark.parametrize("mode, size", [("undersample", 10), ("oversample", 60)])
+def test_classification_rebalances_multiclass_targets_when_enabled(monkeypatch, mode, size):
+    monkeypatch.setattr(data_service.config, "CLASS_BALANCE_MULTICLASS", True)
+    monkeypatch.setattr(data_service.config, "CLASS_BALANCE_MODE", mode)
+    df = labelled({"a": 60, "b": 25, "c": 10})
+
+    cleaned, report = data_service.advanced_clean_dataframe(df, "Label", "classification")
+
+    assert cleaned["Label"].value_counts().to_dict() == {"a": size, "b": size, "c": size}
+    assert report["class_imbalance"]["after_rows"] == 3 * size
+    assert set(report["class_distribution"]) == {"a", "b", "c"}
+    if mode == "undersample":
+        assert cleaned["Value"].is_unique
+
+def test_classification_only_reports_the_distribution_by_default():
+    df = labelled({"a": 60, "b": 25, "c": 10})
+
+    cleaned, report = data_service.advanced_clean_dataframe(df, "Label", "classification")
+
+    assert len(cleaned) == len(df)
+    assert "class_imbalance" not in report
+    assert report["class_distribution"]["a"] == pytest.approx(60 / 95)
+
+def test_mildly_skewed_classes_are_kept(monkeypatch):
+    monkeypatch.setattr(data_service.config, "CLASS_BALANCE_MULTICLASS", True)
+    df = labelled({"a": 20, "b": 15, "c": 10})
+
+    cleaned, report = data_service.advanced_clean_dataframe(df, "Label", "classification")
+
+    assert report["class_imbalance"] == "not detected"
+    assert len(cleaned) == len(df)
+
+def test_binary_balancing_is_unchanged():
+    df = labelled({"yes": 90, "no": 10})
+
+    cleaned, report = data_service.advanced_clean_dataframe(df, "Label", "binary_classification")
+
+    assert cleaned["Label"].value_counts().to_dict() == {"yes": 10, "no": 10}
+    assert report["class_imbalance"]["action"] == "undersampling"
+
+def test_cleaning_report_sizes_each_stage_by_its_own_frame():
+    df = pd.concat([reviews()] * 2000, ignore_index=True)
+
+    cleaned, report = data_service.advanced_clean_dataframe(df, None, "general")
+
+    assert [s["stage"] for s in report["stages"]] == ["missing_values", "duplicates"]
+    missing, duplicates = report["stages"]
+    assert missing["rows"] == len(df) and duplicates["rows"] == 3
+    assert missing["frame_mb"] == round(df.memory_usage().sum() / 2**20, 1)
+    assert duplicates["frame_mb"] < missing["frame_mb"]
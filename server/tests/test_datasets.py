@@ -0,0 +1,108 @@
+import io
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+import state
+from main import app
+from routers import data
+from services import metrics_service
+
+client = TestClient(app)
+
+def frame():
+    return pd.DataFrame({
+        "Product_ID": ["a", "b", "b", "c"],
+        "Price": [1.0, 2.0, 2.0, None],
+        "Quantity": [1, 2, 2, 3],
+    })
+
+@pytest.fixture
+def datasets():
+    state.set_df(frame())
+    state.set_df(frame(), "mine", owner="alice")
+    return state.datasets
+
+@pytest.fixture
+def planner(monkeypatch):
+    """Make /ask use the given plan without asking the LLM."""
+    def use(plan):
+        async def build_plan(question, schema):
+            return plan, "test"
+        monkeypatch.setattr(data, "build_plan", build_plan)
+    return use
+
+def test_owned_dataset_is_invisible_to_other_users(datasets):
+    assert state.get_dataset("mine", "alice") is datasets["mine"]
+    assert state.get_dataset("mine", "bob") is None
+    assert state.get_dataset("mine", None) is None
+
+def test_shared_dataset_is_readable_but_not_writable(datasets):
+    shared = state.get_dataset(state.DEFAULT_DATASET, "bob")
+    assert shared is datasets[state.DEFAULT_DATASET]
+    for user_id in (None, "alice", "bob"):
+        assert not state.can_write(shared, user_id)
+    assert state.can_write(datasets["mine"], "alice")
+    assert not state.can_write(datasets["mine"], "bob")
+
+@pytest.mark.parametrize("dataset_id, user_id, status", [
+    (state.DEFAULT_DATASET, "bob", 403),
+    (state.DEFAULT_DATASET, None, 403),
+    ("mine", "bob", 404),
+])
+def test_upload_into_foreign_dataset_is_refused(datasets, dataset_id, user_id, status):
+    form = {"dataset_id": dataset_id, "mode": "append"}
+    if user_id is not None:
+        form["user_id"] = user_id
+
+    response = client.post(
+        "/upload",
+        files={"file": ("rows.csv", io.BytesIO(b"Product_ID,Price,Quantity\nz,9.0,9\n"))},
+        data=form,
+    )
+    assert response.status_code == status
+    assert state.get_df(dataset_id).equals(frame())
+
+def test_clean_of_shared_dataset_is_refused(datasets, planner):
+    planner({"operator": "clean"})
+    version = datasets[state.DEFAULT_DATASET].version
+
+    response = client.post("/ask", json={"question": "clean the data", "user_id": "bob"})
+
+    assert response.status_code == 200
+    assert "shared" in response.json()["answer"]
+    assert datasets[state.DEFAULT_DATASET].version == version
+    assert state.get_df(state.DEFAULT_DATASET).equals(frame())
+
+def test_anonymous_upload_stays_writable_without_a_user_id(datasets, planner):
+    anonymous = state.set_df(frame(), "anon")
+    assert state.can_write(anonymous, None)
+    assert not state.can_write(anonymous, "bob")
+
+    planner({"operator": "clean"})
+    version = anonymous.version
+    response = client.post("/ask", json={"question": "clean the data", "dataset_id": "anon"})
+
+    assert "shared" not in response.json()["answer"]
+    assert anonymous.version > version
+
+def test_clean_download_link_works_for_owner(datasets, planner):
+    planner({"operator": "clean"})
+
+    response = client.post("/ask", json={"question": "clean the data", "user_id": "alice", "dataset_id": "mine"})
+
+    answer = response.json()["answer"]
+    link = answer[answer.index("/download?"):answer.rindex(")")]
+    assert "user_id=alice" in link
+    download = client.get(link)
+    assert download.status_code == 200
+    assert len(download.text.strip().splitlines()) == 4  # header + rows left after dropping the duplicate
+
+def test_operator_metric_labels_are_bounded(datasets, planner):
+    planner({"operator": "drop_all_tables; --"})
+
+    response = client.post("/ask", json={"question": "do something odd"})
+
+    assert response.status_code == 200
+    labels = [labels for name, labels in metrics_service.histograms if name == "vectora_operator_seconds"]
+    assert not any("drop_all_tables" in str(label) for label in labels)
+    assert any("other" in str(label) for label in labels)
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+import state
+from main import app
+from routers import data
+from services import analysis_service, executor_service, model_service
+
+PLAN = {"operator": "sales_diagnostics", "target": "Sales"}
+
+def sales(rows, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"Price": rng.uniform(1, 100, rows), "Discount": rng.uniform(0, 0.5, rows)})
+    df["Sales"] = 3.0 * df["Price"] - 40.0 * df["Discount"] + rng.normal(0, 1, rows)
+    return df
+
+def worker_model_stats():
+    return dict(model_service.model_cache_stats)
+
+@pytest.fixture
+def workers(monkeypatch):
+    monkeypatch.setattr(executor_service.config, "PLAN_WORKERS", 1)
+    model_service.model_cache.clear()
+    yield
+    executor_service.close_workers()
+
+def run(plan, dataset_id):
+    dataset = state.datasets[dataset_id]
+    return asyncio.run(executor_service.execute_plan(plan, dataset, dataset.cache))
+
+def test_worker_fits_come_back_to_the_server(workers):
+    state.set_df(sales(1000, 1), "ds", owner="alice")
+
+    result = run(PLAN, "ds")
+
+    assert [d["feature"] for d in result["top_drivers"]] == ["Price", "Discount"]
+    assert model_service.version_entries(state.datasets["ds"].cache["version"])
+
+def test_fresh_worker_refits_appended_rows_incrementally(workers):
+    state.set_df(sales(1000, 1), "ds", owner="alice")
+    run(PLAN, "ds")
+    # The next plan lands on a worker that has never seen the parent version
+    executor_service.close_workers()
+
+    state.append_df(sales(300, 2), "ds", owner="alice")
+    result = run(PLAN, "ds")
+
+    stats = asyncio.run(executor_service.run_in_worker(worker_model_stats))
+    assert stats["incremental"] == 1
+    inline = analysis_service.sales_diagnostics(state.get_df("ds"), PLAN)
+    assert result["top_drivers"] == inline["top_drivers"]
+
+def test_timeout_replaces_the_worker(workers):
+    async def timed_out():
+        with pytest.raises(asyncio.TimeoutError):
+            await executor_service.run_in_worker(time.sleep, 30, timeout=0.5)
+        return await executor_service.run_in_worker(sum, [1, 2])
+
+    started = time.monotonic()
+    assert asyncio.run(timed_out()) == 3
+    assert time.monotonic() - started < 30
+    assert len(executor_service.workers) == 1
+
+def test_slow_plan_answers_504(monkeypatch):
+    state.set_df(sales(100, 1), "ds", owner="alice")
+
+    async def build_plan(question, schema):
+        return {"operator": "describe"}, "test"
+    def slow_plan(plan, df, cache):
+        time.sleep(1)
+    monkeypatch.setattr(data, "build_plan", build_plan)
+    monkeypatch.setattr(analysis_service, "run_plan", slow_plan)
+    monkeypatch.setattr(executor_service.config, "PLAN_TIMEOUT_SECONDS", 0.1)
+
+    response = TestClient(app).post("/ask", json={"question": "describe", "user_id": "alice", "dataset_id": "ds"})
+
+    assert response.status_code == 504
+
+def test_waiting_for_a_busy_worker_counts_towards_the_timeout(workers):
+    async def scenario():
+        busy = asyncio.ensure_future(executor_service.run_in_worker(time.sleep, 2))
+        await asyncio.sleep(0.5)  # the only worker has taken the task
+
+        started = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await executor_service.run_in_worker(sum, [1, 2], timeout=0.5)
+        waited = time.monotonic() - started
+
+        async def gone():
+            return True
+        with pytest.raises(executor_service.PlanCancelled):
+            await executor_service.run_in_worker(sum, [1, 2], is_disconnected=gone)
+
+        await busy
+        return waited, await executor_service.run_in_worker(sum, [1, 2])
+
+    waited, total = asyncio.run(scenario())
+    assert waited < 1.5
+    assert total == 3
+    assert len(executor_service.workers) == 1
+
+def test_timed_out_inline_plan_keeps_the_dataset_pinned(monkeypatch):
+    dataset = state.set_df(sales(100, 1), "ds", owner="alice")
+    finished = threading.Event()
+
+    def slow_plan(plan, df, cache):
+        time.sleep(0.5)
+        pinned.append(dataset.refs)
+        finished.set()
+    pinned = []
+    monkeypatch.setattr(analysis_service, "run_plan", slow_plan)
+    monkeypatch.setattr(executor_service.config, "PLAN_TIMEOUT_SECONDS", 0.1)
+
+    async def scenario():
+        with state.acquire("ds"):
+            await executor_service.execute_plan({"operator": "describe"}, dataset, dataset.cache)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(scenario())
+    assert dataset.refs == 1  # the request's pin is gone, the thread's is not
+
+    assert finished.wait(2)
+    assert pinned == [1]
+    time.sleep(0.05)
+    assert dataset.refs == 0
@@ -0,0 +1,32 @@
+import io
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from services import export_service
+
+class Sink(io.BytesIO):
+    def close(self):
+        self.data = self.getvalue()
+        super().close()
+
+def export(df, format):
+    sink = Sink()
+    for _ in export_service.encode_table(df, sink, format, None):
+        pass
+    reader = pq.read_table if format == "parquet" else lambda buf: pa.ipc.open_file(buf).read_all()
+    return reader(pa.BufferReader(sink.data)).to_pandas()
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_columns_that_change_after_the_first_chunk_are_exported(monkeypatch, format):
+    monkeypatch.setattr(export_service.config, "EXPORT_CHUNK_ROWS", 3)
+    df = pd.DataFrame({
+        "Note": pd.Series([None, None, None, "late", None], dtype=object),
+        "Price": [1.0, 2.0, 3.0, None, 5.0],
+    })
+
+    exported = export(df, format)
+
+    assert exported["Note"].tolist()[3] == "late"
+    assert exported["Price"].isna().tolist() == [False, False, False, True, False]
+    assert len(exported) == 5
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+import state
+from services import ingest_service
+from services.ingest_service import ingest_file
+from services.job_service import create_job, get_job
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(ingest_service.config, "CSV_CHUNK_ROWS", 4)
+
+def ingest(tmp_path, text):
+    path = tmp_path / "upload.csv"
+    path.write_text(text)
+    job = create_job("upload", dataset_id="ds", owner="alice")
+
+    ingest_file(job["id"], str(path), "upload.csv", "ds", owner="alice")
+
+    assert get_job(job["id"])["status"] == "done", get_job(job["id"])
+    return state.get_df("ds")
+
+def rows(codes, prices, quantities):
+    lines = ["Code,Price,Qty"] + [f"{c},{p},{q}" for c, p, q in zip(codes, prices, quantities)]
+    return "\n".join(lines) + "\n"
+
+def test_mixed_column_past_the_first_chunk_leaves_the_others_numeric(tmp_path):
+    codes = [str(100 + n) for n in range(10)] + ["A-7"]
+    prices = [f"{n}.5" for n in range(11)]
+    quantities = list(range(11))
+
+    df = ingest(tmp_path, rows(codes, prices, quantities))
+
+    assert df["Price"].dtype == np.float64
+    assert df["Qty"].dtype == np.int64
+    assert pd.api.types.is_string_dtype(df["Code"])
+    assert df["Code"].tolist() == codes
+    assert df["Qty"].sum() == sum(quantities)
+
+def test_fractions_after_the_first_chunk_widen_only_that_column(tmp_path):
+    quantities = [str(n) for n in range(10)] + ["2.5"]
+
+    df = ingest(tmp_path, rows(range(11), [1.0] * 11, quantities))
+
+    assert df["Qty"].dtype == np.float64
+    assert df["Code"].dtype == np.int64
+    assert df["Qty"].tolist() == [float(q) for q in quantities]
+
+def test_whole_floats_in_an_integer_column_stay_integers(tmp_path):
+    # A missing value makes pandas read a chunk's integers as floats
+    quantities = [str(n) for n in range(8)] + ["", "8", "9"]
+    prices = ["1.0"] * 11
+
+    df = ingest(tmp_path, rows(range(11), prices, quantities))
+
+    assert df["Qty"].dtype == np.int64
+    assert df["Qty"].tolist() == [n for n in range(10)]
@@ -0,0 +1,45 @@
+import asyncio
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+import state
+from main import app
+from services import clean_service
+from services.job_service import create_job, get_job
+
+client = TestClient(app)
+
+@pytest.mark.parametrize("endpoint", ["/jobs/{id}", "/download/advanced"])
+def test_jobs_are_only_visible_to_their_owner(endpoint):
+    job = create_job("clean", dataset_id="default", owner="alice")
+    url = endpoint.format(id=job["id"])
+
+    for params in ({"user_id": "bob"}, {}):
+        params["job_id"] = job["id"]
+        assert client.get(url, params=params).status_code == 404
+
+def test_owner_sees_their_job():
+    job = create_job("upload", dataset_id="mine", owner="alice")
+
+    response = client.get(f"/jobs/{job['id']}", params={"user_id": "alice"})
+
+    assert response.status_code == 200
+    assert response.json()["id"] == job["id"]
+
+def test_anonymous_jobs_stay_visible():
+    job = create_job("upload", dataset_id="mine")
+
+    assert client.get(f"/jobs/{job['id']}", params={"user_id": "bob"}).status_code == 200
+
+def test_clean_job_that_cannot_load_its_data_fails(monkeypatch):
+    dataset = state.set_df(pd.DataFrame({"Price": [1.0, 2.0]}), "ds", owner="alice", persist=False)
+    job = create_job("clean", dataset_id="ds", owner="alice")
+    def unreadable(dataset_id, columns=None):
+        raise OSError("dataset file is gone")
+    monkeypatch.setattr(clean_service.state, "get_df", unreadable)
+
+    asyncio.run(clean_service.run_clean_job(job["id"], dataset, None, "general"))
+
+    failed = get_job(job["id"])
+    assert failed["status"] == "failed"
+    assert "dataset file is gone" in failed["error"]
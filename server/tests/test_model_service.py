@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+import state
+from services import model_service
+
+FEATURES = ["Price", "Discount"]
+
+def sales(rows, seed):
+    rng = np.random.default_rng(seed)
+    price = rng.uniform(1, 100, rows)
+    discount = rng.uniform(0, 0.5, rows)
+    return pd.DataFrame({
+        "Price": price,
+        "Discount": discount,
+        "Sales": 3.0 * price - 40.0 * discount + 7.0 + rng.normal(0, 1, rows),
+    })
+
+def least_squares(df):
+    X = np.column_stack([df[FEATURES].to_numpy(), np.ones(len(df))])
+    solution = np.linalg.lstsq(X, df["Sales"].to_numpy(), rcond=None)[0]
+    return solution[:-1], solution[-1]
+
+@pytest.fixture(autouse=True)
+def empty_model_cache():
+    model_service.model_cache.clear()
+    model_service.model_cache_stats.update(hits=0, misses=0, incremental=0)
+
+def fit(dataset_id):
+    dataset = state.datasets[dataset_id]
+    return model_service.fit_linear_model(state.get_df(dataset_id), "Sales", FEATURES, dataset.cache)
+
+def test_same_version_is_served_from_cache():
+    state.set_df(sales(500, 1), "ds", owner="alice")
+
+    first = fit("ds")
+    second = fit("ds")
+
+    assert second is first
+    assert model_service.model_cache_stats == {"hits": 1, "misses": 1, "incremental": 0}
+
+def test_appended_rows_refit_incrementally(monkeypatch):
+    monkeypatch.setattr(model_service.config, "MODEL_CHUNK_ROWS", 128)
+    state.set_df(sales(1000, 1), "ds", owner="alice")
+    fit("ds")
+
+    folded = []
+    accumulate = model_service.accumulate
+    def counting_accumulate(equations, batches):
+        batches = list(batches)
+        folded.append(sum(len(y) for _, y in batches))
+        return accumulate(equations, batches)
+    monkeypatch.setattr(model_service, "accumulate", counting_accumulate)
+
+    state.append_df(sales(300, 2), "ds", owner="alice")
+    model = fit("ds")
+
+    assert model_service.model_cache_stats["incremental"] == 1
+    assert folded == [300]  # only the appended rows were read
+
+    coef, intercept = least_squares(state.get_df("ds"))
+    np.testing.assert_allclose(model.coef_, coef, rtol=1e-8)
+    assert model.intercept_ == pytest.approx(intercept, rel=1e-8)
+
+def test_replaced_dataset_is_fitted_from_scratch():
+    state.set_df(sales(500, 1), "ds", owner="alice")
+    fit("ds")
+
+    state.set_df(sales(500, 3), "ds", owner="alice")
+    model = fit("ds")
+
+    assert model_service.model_cache_stats["incremental"] == 0
+    coef, _ = least_squares(state.get_df("ds"))
+    np.testing.assert_allclose(model.coef_, coef, rtol=1e-8)
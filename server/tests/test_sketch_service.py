@@ -0,0 +1,15 @@
+import pandas as pd
+from services import sketch_service
+from services.sketch_service import approx_mode
+
+def test_mode_that_never_wins_a_chunk_is_found(monkeypatch):
+    monkeypatch.setattr(sketch_service.config, "SKETCH_CHUNK_ROWS", 100)
+    chunks = []
+    for i in range(3):
+        # Each chunk has its own local winner; "mode" is second everywhere
+        fillers = [f"filler-{i}-{n}" for n in range(30)]
+        chunks.extend([f"winner-{i}"] * 40 + ["mode"] * 30 + fillers)
+    series = pd.Series(chunks)
+
+    assert series.value_counts().index[0] == "mode"
+    assert approx_mode(series) == "mode"
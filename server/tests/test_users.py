@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from main import app
+from services import user_service
+
+client = TestClient(app)
+
+def matches(doc, query):
+    """The subset of Mongo's query language the services use."""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = doc.get(key)
+            for op, operand in condition.items():
+                if op == "$lt" and not value < operand:
+                    return False
+                if op == "$gt" and not value > operand:
+                    return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+def project(doc, projection):
+    shown = {key for key, on in projection.items() if on}
+    if projection.get("_id", 1):
+        shown.add("_id")
+    return {key: value for key, value in doc.items() if key in shown}
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=None):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self.docs = sorted(self.docs, key=lambda d: d[field], reverse=order < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find(self, query, projection):
+        self.queries.append(query)
+        return FakeCursor([project(doc, projection) for doc in self.docs if matches(doc, query)])
+
+@pytest.fixture
+def database(monkeypatch):
+    collections = {}
+    monkeypatch.setattr(user_service.db, "get_db", lambda: collections)
+    return collections
+
+@pytest.fixture
+def users(database):
+    docs = [
+        {"_id": ObjectId(), "email": f"user{n}@example.com", "username": f"User {n}", "password_hash": "secret"}
+        for n in (3, 1, 4, 0, 2)
+    ]
+    database["ai.Users"] = FakeCollection(docs)
+    return docs
+
+@pytest.fixture
+def chats(database):
+    start = datetime(2026, 1, 1)
+    docs = []
+    for n in range(7):
+        # q4 and q5 share a timestamp, and a page boundary falls between them
+        when = start + timedelta(seconds=n if n < 5 else n - 1)
+        docs.append({"_id": ObjectId(), "user_id": "alice", "question": f"q{n}", "answer": f"a{n}", "timestamp": when})
+    docs.append({"_id": ObjectId(), "user_id": "bob", "question": "bob's", "answer": "private", "timestamp": start})
+    docs.append({"_id": ObjectId(), "user_id": None, "question": "anonymous", "answer": "-", "timestamp": start})
+    database["chats"] = FakeCollection(docs)
+    return database["chats"]
+
+def pages(url, params, cursor_param):
+    pages, cursor = [], None
+    while True:
+        response = client.get(url, params={**params, **({cursor_param: cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        pages.append(body)
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+def test_users_are_paged_without_ids_or_hashes(users):
+    listed = [page["users"] for page in pages("/users", {"limit": 2}, "after")]
+
+    assert [len(page) for page in listed] == [2, 2, 1]
+    listed = [user for page in listed for user in page]
+    assert [user["email"] for user in listed] == [f"user{n}@example.com" for n in range(5)]
+    assert all(set(user) == {"email", "username"} for user in listed)
+
+def test_bad_page_size_is_rejected(users):
+    assert client.get("/users", params={"limit": 0}).status_code == 400
+
+def test_chat_history_is_the_callers_own_newest_first(chats):
+    listed = [page["chats"] for page in pages("/chats", {"user_id": "alice", "limit": 2}, "before")]
+
+    assert [len(page) for page in listed] == [2, 2, 2, 1]
+    questions = [chat["question"] for page in listed for chat in page]
+    assert questions == [f"q{n}" for n in reversed(range(7))]
+    assert all("user_id" not in chat for page in listed for chat in page)
+    # Every page is a seek on the (user_id, timestamp, _id) index
+    assert all(query["user_id"] == "alice" for query in chats.queries)
+
+def test_chat_history_needs_a_user_and_a_valid_cursor(chats):
+    assert client.get("/chats").status_code == 422
+    assert client.get("/chats", params={"user_id": "alice", "before": "yesterday"}).status_code == 400
+    assert client.get("/chats", params={"user_id": "carol"}).json() == {"chats": [], "next_cursor": None}